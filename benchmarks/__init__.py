@@ -0,0 +1,44 @@
+"""
+Benchmarks for the HybridRouter.
+
+Each module can be run on its own, from the root of the repository:
+
+    python -m benchmarks.path_converters
+"""
+
+import timeit
+
+
+def setup_django():
+    """
+    Configure a minimal Django project so routers can be built and resolved
+    outside of the test suite.
+    """
+    import django
+    from django.conf import settings
+
+    if not settings.configured:
+        settings.configure(
+            ALLOWED_HOSTS=["*"],
+            SECRET_KEY="not very secret in benchmarks",
+            ROOT_URLCONF=None,
+            INSTALLED_APPS=[
+                "django.contrib.auth",
+                "django.contrib.contenttypes",
+                "rest_framework",
+            ],
+            REST_FRAMEWORK={
+                "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+                "DEFAULT_PARSER_CLASSES": ("rest_framework.parsers.JSONParser",),
+                "UNAUTHENTICATED_USER": None,
+            },
+        )
+        django.setup()
+
+
+def best_of(func, number, repeat=5):
+    """
+    Return the best time per call of `func`, in microseconds.
+    """
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
@@ -0,0 +1,85 @@
+"""
+Compare the throughput of the API root and intermediate views served through
+Django's ASGI handler, as sync views (the default) and as coroutine views
+(`async_views = True`), with concurrent clients.
+
+    python -m benchmarks.asgi [--clients 50] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import time
+import types
+
+from . import setup_django
+
+
+def build_urlconf(async_views):
+    from django.urls import include, path
+    from rest_framework.response import Response
+    from rest_framework.viewsets import ViewSet
+
+    from hybridrouter import HybridRouter
+
+    class BenchViewSet(ViewSet):
+        def list(self, request):
+            return Response()
+
+    router = HybridRouter()
+    router.async_views = async_views
+    for idx in range(20):
+        router.register(
+            f"group-{idx % 4}/resource-{idx}", BenchViewSet, basename=f"res-{idx}"
+        )
+
+    urlconf = types.ModuleType(f"bench_urlconf_{async_views}")
+    urlconf.urlpatterns = [path("", include(router.urls))]
+    return urlconf
+
+
+async def request_all(urls, clients, requests):
+    from django.test import AsyncClient
+
+    async def client_loop(client, count):
+        for idx in range(count):
+            response = await client.get(urls[idx % len(urls)])
+            assert response.status_code == 200, response.status_code
+
+    per_client = requests // clients
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client_loop(AsyncClient(), per_client) for _ in range(clients))
+    )
+    return per_client * clients / (time.perf_counter() - start)
+
+
+def run(clients, requests, repeat=3):
+    from asgiref.sync import async_to_sync
+    from django.test import override_settings
+
+    urls = ["/", "/group-0/", "/group-1/"]
+    results = {}
+    for mode, async_views in (("sync", False), ("async", True)):
+        with override_settings(ROOT_URLCONF=build_urlconf(async_views)):
+            results[mode] = max(
+                async_to_sync(request_all)(urls, clients, requests)
+                for _ in range(repeat)
+            )
+
+    print(f"{clients} concurrent clients, {requests} requests (requests/s)")
+    print(f"{'sync':>12}{'async':>12}")
+    print(f"{results['sync']:12.0f}{results['async']:12.0f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    setup_django()
+    run(args.clients, args.requests)
+
+
+if __name__ == "__main__":
+    main()
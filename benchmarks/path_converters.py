@@ -0,0 +1,85 @@
+"""
+Compare resolve and reverse times of ViewSet routes emitted with `re_path`
+(the default) and with `path()` converters (`use_path_converters = True`).
+
+    python -m benchmarks.path_converters [--viewsets 200]
+"""
+
+import argparse
+import types
+
+from . import best_of, setup_django
+
+
+def build_urlconf(viewsets, use_path_converters, trailing_slash):
+    from django.urls import include, path
+    from rest_framework.response import Response
+    from rest_framework.viewsets import ViewSet
+
+    from hybridrouter import HybridRouter
+
+    class BenchViewSet(ViewSet):
+        def list(self, request):
+            return Response()
+
+        def retrieve(self, request, pk=None):
+            return Response()
+
+    router = HybridRouter()
+    router.trailing_slash = trailing_slash
+    router.use_path_converters = use_path_converters
+    for idx in range(viewsets):
+        router.register(f"resource-{idx}", BenchViewSet, basename=f"resource-{idx}")
+
+    urlconf = types.ModuleType(f"bench_urlconf_{use_path_converters}")
+    urlconf.urlpatterns = [path("", include(router.urls))]
+    return urlconf
+
+
+def run(viewsets, trailing_slash):
+    from django.urls import clear_url_caches, resolve, reverse
+
+    last = viewsets - 1
+    paths = {
+        "first-list": "/resource-0/",
+        "last-list": f"/resource-{last}/",
+        "last-detail": f"/resource-{last}/42/",
+    }
+    results = {}
+    for mode, use_path_converters in (("re_path", False), ("path", True)):
+        urlconf = build_urlconf(viewsets, use_path_converters, trailing_slash)
+        clear_url_caches()
+        timings = {}
+        for label, path_info in paths.items():
+            timings[f"resolve {label}"] = best_of(
+                lambda: resolve(path_info, urlconf), number=200
+            )
+        timings["reverse last-detail"] = best_of(
+            lambda: reverse(
+                f"resource-{last}-detail", kwargs={"pk": 42}, urlconf=urlconf
+            ),
+            number=200,
+        )
+        results[mode] = timings
+
+    print(f"{viewsets} ViewSets, trailing_slash={trailing_slash!r} (us per call)")
+    print(f"{'':24}{'re_path':>12}{'path':>12}")
+    for label in results["re_path"]:
+        print(
+            f"{label:24}{results['re_path'][label]:12.2f}{results['path'][label]:12.2f}"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--viewsets", type=int, default=200)
+    args = parser.parse_args()
+    setup_django()
+    for trailing_slash in ("/", "/?"):
+        run(args.viewsets, trailing_slash)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Measure how the HybridRouter scales: route build, memory, resolve, reverse
+and API root latency for synthetic routers mixing APIViews, @api_view
+functions and ViewSets in wide and deep trees.
+
+    python -m benchmarks.routing [--sizes 100 1000 10000] [--shapes wide deep]
+                                 [--modes default tree path merged
+                                          instrumented cached] [--output FILE]
+
+The results are written as JSON (to stdout by default) so they can be
+compared between releases.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import types
+from datetime import datetime, timezone
+
+from . import best_of, setup_django
+
+# Router attributes set for each benchmarked mode
+MODES = {
+    "default": {},
+    "tree": {"use_tree_resolver": True},
+    "path": {"use_path_converters": True},
+    "merged": {"merge_viewset_routes": True},
+    "dispatch": {"dispatch_viewset_routes": True},
+    "instrumented": {"instrument_routes": True},
+    "cached": {"cache_viewset_routes": True},
+    "resolve_cache": {"resolve_cache_size": 1024},
+}
+
+
+def make_views():
+    from rest_framework.decorators import api_view
+    from rest_framework.response import Response
+    from rest_framework.views import APIView
+    from rest_framework.viewsets import ViewSet
+
+    class BenchView(APIView):
+        def get(self, request):
+            return Response()
+
+    @api_view(["GET"])
+    def bench_function_view(request):
+        return Response()
+
+    class BenchViewSet(ViewSet):
+        def list(self, request):
+            return Response()
+
+        def retrieve(self, request, pk=None):
+            return Response()
+
+    return [BenchView, bench_function_view, BenchViewSet]
+
+
+def make_prefix(idx, shape):
+    """
+    Return the prefix of the `idx`-th synthetic endpoint. Wide trees put 50
+    endpoints under each group, deep trees nest endpoints 5 levels down with
+    a branching factor of 4.
+    """
+    if shape == "wide":
+        return f"group-{idx // 50}/endpoint-{idx}"
+    parts = []
+    branch = idx
+    for level in range(4):
+        parts.append(f"level{level}-{branch % 4}")
+        branch //= 4
+    parts.append(f"endpoint-{idx}")
+    return "/".join(parts)
+
+
+def make_registrations(size, shape, views):
+    registrations = []
+    for idx in range(size):
+        view = views[idx % len(views)]
+        registrations.append((make_prefix(idx, shape), view, f"endpoint-{idx}"))
+    return registrations
+
+
+def build(registrations, attrs):
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    for attr, value in attrs.items():
+        setattr(router, attr, value)
+
+    start = time.perf_counter()
+    for prefix, view, basename in registrations:
+        router.register(prefix, view, basename=basename)
+    registered = time.perf_counter()
+    urls = router.urls
+    built = time.perf_counter()
+    return router, urls, (registered - start) * 1e3, (built - registered) * 1e3
+
+
+def register_many(registrations, attrs):
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    for attr, value in attrs.items():
+        setattr(router, attr, value)
+
+    start = time.perf_counter()
+    router.register_many(registrations)
+    return (time.perf_counter() - start) * 1e3
+
+
+def build_cold(registrations, attrs):
+    """
+    `build()` with an empty ViewSet introspection cache, so that every run
+    does the same work.
+    """
+    from hybridrouter.introspection import clear_viewset_introspection_cache
+
+    clear_viewset_introspection_cache()
+    return build(registrations, attrs)
+
+
+def measure_memory(registrations, attrs):
+    """
+    Return the memory, in kB, allocated by a build and still held by the
+    router.
+    """
+    tracemalloc.start()
+    try:
+        _router, _urls, _register_ms, _build_ms = build_cold(registrations, attrs)
+        return tracemalloc.get_traced_memory()[0] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def measure(size, shape, mode, views):
+    from django.urls import clear_url_caches, include, path, resolve, reverse
+    from django.urls.base import set_urlconf
+    from rest_framework.test import APIRequestFactory
+
+    registrations = make_registrations(size, shape, views)
+    attrs = MODES[mode]
+
+    # Imports and one-time initializations are paid by a first build, and
+    # memory is measured in a run of its own since tracing slows the build
+    build_cold(registrations, attrs)
+    memory_kb = measure_memory(registrations, attrs)
+    router, urls, register_ms, build_ms = build_cold(registrations, attrs)
+    register_many_ms = register_many(registrations, attrs)
+
+    urlconf = types.ModuleType(f"bench_urlconf_{shape}_{size}_{mode}")
+    urlconf.urlpatterns = [path("", include(urls))]
+    clear_url_caches()
+    set_urlconf(urlconf)
+
+    number = max(1, 2000 // size)
+    resolve_us = {}
+    reverse_us = {}
+    for label, idx in (("first", 0), ("middle", size // 2), ("last", size - 1)):
+        prefix, view, basename = registrations[idx]
+        is_viewset = view is views[-1]
+        path_info = f"/{prefix}/"
+        url_name = f"{basename}-list" if is_viewset else basename
+        resolve(path_info, urlconf)  # Warm up the resolver
+        resolve_us[label] = best_of(lambda: resolve(path_info, urlconf), number)
+        reverse(url_name, urlconf=urlconf)  # Populate the reverse dicts
+        reverse_us[label] = best_of(lambda: reverse(url_name, urlconf=urlconf), 200)
+
+    # Largest API root listing: the root view for wide trees
+    request = APIRequestFactory().get("/")
+    request.resolver_match = match = resolve("/", urlconf)
+    match.func(request)  # Warm up the reverse cache
+    api_root_us = best_of(lambda: match.func(request), number)
+    set_urlconf(None)
+
+    return {
+        "size": size,
+        "shape": shape,
+        "mode": mode,
+        "patterns": len(router.get_urls()),
+        "register_ms": round(register_ms, 3),
+        "register_many_ms": round(register_many_ms, 3),
+        "build_ms": round(build_ms, 3),
+        "memory_kb": round(memory_kb, 1),
+        "resolve_us": {key: round(value, 3) for key, value in resolve_us.items()},
+        "reverse_us": {key: round(value, 3) for key, value in reverse_us.items()},
+        "api_root_us": round(api_root_us, 3),
+    }
+
+
+def get_metadata():
+    import django
+    import rest_framework
+
+    try:
+        from importlib.metadata import version
+
+        hybridrouter_version = version("djangorestframework-hybridrouter")
+    except Exception:  # pylint: disable=broad-except
+        hybridrouter_version = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "djangorestframework": rest_framework.VERSION,
+        "hybridrouter": hybridrouter_version,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument(
+        "--shapes", nargs="+", choices=("wide", "deep"), default=["wide", "deep"]
+    )
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=["default"])
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    views = make_views()
+    results = []
+    for size in args.sizes:
+        for shape in args.shapes:
+            for mode in args.modes:
+                print(f"Measuring {size} {shape} {mode}...", file=sys.stderr)
+                results.append(measure(size, shape, mode, views))
+
+    report = json.dumps({"meta": get_metadata(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare the cost of router versions that each override one prefix of a base
+router: built from scratch with `register_many()`, and derived from the base
+with `derive()`, which shares the unchanged subtrees.
+
+    python -m benchmarks.versions [--size 1000] [--versions 10]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from . import setup_django
+from .routing import make_registrations, make_views
+
+
+def build_versions(registrations, versions, derive):
+    from hybridrouter import HybridRouter
+
+    base = HybridRouter()
+    base.register_many(registrations)
+    base.urls
+    routers = [base]
+    start = time.perf_counter()
+    for idx in range(versions):
+        prefix, view, basename = registrations[idx * 7 % len(registrations)]
+        if derive:
+            router = base.derive(overrides=[(prefix, view, basename)])
+        else:
+            router = HybridRouter()
+            router.register_many(registrations)
+        router.urls
+        routers.append(router)
+    return routers, (time.perf_counter() - start) * 1e3
+
+
+def run(size, versions):
+    registrations = make_registrations(size, "wide", make_views())
+    results = {}
+    for mode, derive in (("rebuilt", False), ("derived", True)):
+        tracemalloc.start()
+        _routers, build_ms = build_versions(registrations, versions, derive)
+        memory_kb = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+        results[mode] = (build_ms, memory_kb)
+
+    print(f"{versions} versions of a router with {size} registrations")
+    print(f"{'':>10}{'build (ms)':>14}{'memory (kB)':>14}")
+    for mode, (build_ms, memory_kb) in results.items():
+        print(f"{mode:>10}{build_ms:14.1f}{memory_kb:14.0f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--versions", type=int, default=10)
+    args = parser.parse_args()
+    setup_django()
+    run(args.size, args.versions)
+
+
+if __name__ == "__main__":
+    main()
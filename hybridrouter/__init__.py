@@ -1 +1 @@
-from .hybridrouter import HybridRouter, TreeNode
+from .hybridrouter import HybridRouter, Registration, TreeNode
@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class HybridRouterConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "hybridrouter"
+
+    def ready(self):
+        from .discovery import DISCOVERY_MODULES
+
+        # Submodules of each installed app scanned by `router.autodiscover()`
+        modules = getattr(settings, "HYBRIDROUTER_DISCOVERY_MODULES", DISCOVERY_MODULES)
+        if isinstance(modules, str) or not all(
+            isinstance(module, str) for module in modules
+        ):
+            raise ImproperlyConfigured(
+                "HYBRIDROUTER_DISCOVERY_MODULES must be a list of module names."
+            )
+        self.discovery_modules = tuple(modules)
+        # Default manifest of the routers that do not set `discovery_manifest`
+        self.discovery_manifest = getattr(
+            settings, "HYBRIDROUTER_DISCOVERY_MANIFEST", None
+        )
@@ -0,0 +1,49 @@
+from django.urls import register_converter
+
+
+class LookupConverter:
+    """
+    Path converter matching a ViewSet lookup value.
+
+    Unlike Django's built-in converters, the value is passed to the view as a
+    string, exactly as the equivalent `re_path` named group would be.
+    """
+
+    regex = "[^/.]+"
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return str(value)
+
+
+class IntLookupConverter(LookupConverter):
+    regex = "[0-9]+"
+
+
+class DigitLookupConverter(LookupConverter):
+    regex = r"\d+"
+
+
+class SlugLookupConverter(LookupConverter):
+    regex = "[-a-zA-Z0-9_]+"
+
+
+class UUIDLookupConverter(LookupConverter):
+    regex = "[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+
+
+# Converter name for each supported `lookup_value_regex`. A ViewSet whose
+# lookup regex is not listed here keeps its `re_path` patterns.
+LOOKUP_CONVERTERS = {}
+
+for _name, _converter in (
+    ("hybridrouter_lookup", LookupConverter),
+    ("hybridrouter_int", IntLookupConverter),
+    ("hybridrouter_digits", DigitLookupConverter),
+    ("hybridrouter_slug", SlugLookupConverter),
+    ("hybridrouter_uuid", UUIDLookupConverter),
+):
+    register_converter(_converter, _name)
+    LOOKUP_CONVERTERS[_converter.regex] = _name
@@ -0,0 +1,422 @@
+import os
+from importlib import import_module
+from importlib.util import find_spec
+from threading import Lock
+
+from django.apps import apps
+from django.utils.module_loading import import_string
+from rest_framework.routers import Route
+
+from .introspection import ViewSetIntrospection
+from .snapshot import (
+    dump_value,
+    get_mro_signatures,
+    get_source_file_signature,
+    load_value,
+    read_json,
+    write_json,
+)
+from .utils import logger
+from .views import is_async_view
+
+try:
+    from asgiref.sync import markcoroutinefunction
+except ImportError:  # asgiref < 3.6
+    from asyncio.coroutines import _is_coroutine
+
+    def markcoroutinefunction(func):
+        func._is_coroutine = _is_coroutine
+        return func
+
+
+MANIFEST_VERSION = 4
+
+# Submodules of each installed app scanned for marked views, unless the
+# HYBRIDROUTER_DISCOVERY_MODULES setting says otherwise
+DISCOVERY_MODULES = ("views", "viewsets")
+
+# Attribute holding the `(prefix, basename)` pairs a view is registered at
+ROUTES_ATTRIBUTE = "hybridrouter_routes"
+
+# Looked up by Django and the router to tell classes from functions, a
+# LazyView answers them without importing the view. So are the dunder names
+# and the "_is_coroutine" markers of coroutine functions.
+_NOT_DELEGATED = frozenset(("as_view", "view_class"))
+
+# Attributes of a view read by Django before calling it (CSRF, transaction
+# and login middleware), recorded in a manifest so that a LazyView answers
+# them without importing the view
+VIEW_ATTRIBUTES = (
+    "csrf_exempt",
+    "_non_atomic_requests",
+    "login_required",
+    "login_url",
+    "redirect_field_name",
+)
+
+
+def route(prefix, basename=None):
+    """
+    Mark an APIView, ViewSet or @api_view-decorated function to be registered
+    at `prefix` by `HybridRouter.autodiscover()`. The decorator can be
+    stacked to register a view at several prefixes, and goes above
+    `@api_view`.
+    """
+
+    def decorator(view):
+        routes = list(view.__dict__.get(ROUTES_ATTRIBUTE, ()))
+        routes.insert(0, (prefix, basename))  # Decorators apply bottom-up
+        setattr(view, ROUTES_ATTRIBUTE, routes)
+        return view
+
+    return decorator
+
+
+def get_marked_routes(obj):
+    """
+    Return the `(prefix, basename)` pairs `obj` is marked with. Only the
+    object's own attribute counts, subclasses of a marked view are not
+    marked.
+    """
+    try:
+        routes = vars(obj).get(ROUTES_ATTRIBUTE)
+    except TypeError:
+        return ()
+    if not routes:
+        return ()
+    return [(item, None) if isinstance(item, str) else tuple(item) for item in routes]
+
+
+def get_discovery_defaults():
+    """
+    Return the submodules scanned and the manifest used by default, as read
+    from the settings by the app.
+    """
+    if apps.is_installed("hybridrouter"):
+        app_config = apps.get_app_config("hybridrouter")
+        return app_config.discovery_modules, app_config.discovery_manifest
+    return DISCOVERY_MODULES, None
+
+
+def iter_discovery_modules(module_names):
+    """
+    Yield `(name, spec)` for the `module_names` submodules of every installed
+    app that has them, without importing them.
+    """
+    for app_config in apps.get_app_configs():
+        for module_name in module_names:
+            name = f"{app_config.name}.{module_name}"
+            try:
+                spec = find_spec(name)
+            except ImportError:  # The app is a module, not a package
+                spec = None
+            if spec is not None:
+                yield name, spec
+
+
+def get_source_signature(spec):
+    """
+    Identify the source files of a module, all of them for a package.
+    """
+    filenames = []
+    if spec.submodule_search_locations:
+        for location in spec.submodule_search_locations:
+            for root, dirs, files in os.walk(location):
+                dirs.sort()
+                filenames.extend(
+                    os.path.join(root, name)
+                    for name in sorted(files)
+                    if name.endswith(".py")
+                )
+    elif spec.origin:
+        filenames.append(spec.origin)
+    signature = []
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        signature.append([filename, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def dump_view_attributes(view, actions=None):
+    """
+    Return the VIEW_ATTRIBUTES of the callable `view` is served by, in JSON
+    form. `actions` is the mapping of one of the routes of a ViewSet.
+    """
+    if actions is not None:
+        view = view.as_view(actions)
+    elif isinstance(view, type):
+        view = view.as_view()
+    attributes = {}
+    for name in VIEW_ATTRIBUTES:
+        try:
+            value = getattr(view, name)
+        except AttributeError:
+            continue
+        if isinstance(value, (set, frozenset)):
+            value = {"__set__": sorted(value)}
+        else:
+            value = dump_value(value)
+        attributes[name] = value
+    return attributes
+
+
+def load_view_attributes(attributes):
+    return {
+        name: (
+            set(value["__set__"])
+            if isinstance(value, dict) and "__set__" in value
+            else load_value(value)
+        )
+        for name, value in attributes.items()
+    }
+
+
+def scan_marked_views(module_names):
+    """
+    Import the `module_names` submodules of every installed app and return a
+    `(prefix, view, basename, import_path)` tuple for each route of the
+    marked views, in app, module and definition order. The import path is
+    the module attribute the view was found as, since @api_view-decorated
+    functions cannot be located from their name.
+    """
+    found = []
+    seen = set()
+    for name, _spec in iter_discovery_modules(module_names):
+        module = import_module(name)
+        for attr, obj in list(vars(module).items()):
+            routes = get_marked_routes(obj)
+            if not routes or id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            found.extend(
+                (prefix, obj, basename, f"{name}.{attr}") for prefix, basename in routes
+            )
+    return found
+
+
+class LazyView:
+    """
+    Stand-in for a view known by its import path. The view is imported, and
+    `as_view()` called for classes, by the first request. The VIEW_ATTRIBUTES
+    are the recorded `attributes`, the others (`cls`, `initkwargs`...) are
+    looked up on the imported view. A stand-in for an async view is marked as
+    a coroutine function, so that ASGI servers await it instead of calling
+    it in a thread.
+    """
+
+    def __init__(
+        self,
+        import_path,
+        actions=None,
+        initkwargs=None,
+        is_async=False,
+        attributes=None,
+    ):
+        module, _, name = import_path.rpartition(".")
+        # Used by Django to identify the view without importing it
+        self.__module__ = module
+        self.__name__ = self.__qualname__ = name
+        # The VIEW_ATTRIBUTES recorded in the manifest, checked before the call
+        self.__dict__.update(load_view_attributes(attributes or {}))
+        self.import_path = import_path
+        self.actions = actions  # ViewSet actions, None for other views
+        self._initkwargs = initkwargs  # ViewSet initkwargs, as dumped in a manifest
+        self._view = None
+        self._lock = Lock()
+        if is_async:
+            markcoroutinefunction(self)
+
+    def get_view(self):
+        if self._view is None:
+            with self._lock:
+                if self._view is None:
+                    view = import_string(self.import_path)
+                    if self.actions is not None:
+                        view = view.as_view(
+                            self.actions, **load_value(self._initkwargs)
+                        )
+                    elif isinstance(view, type):
+                        view = view.as_view()
+                    self._view = view
+        return self._view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.get_view()(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if (
+            name.startswith("__")
+            or name.startswith("_is_coroutine")
+            or name in _NOT_DELEGATED
+            or name in VIEW_ATTRIBUTES
+        ):
+            raise AttributeError(name)
+        return getattr(self.get_view(), name)
+
+    def __repr__(self):
+        return f"<LazyView {self.import_path}>"
+
+
+class LazyViewSet:
+    """
+    Stand-in for a ViewSet class known by its import path and the
+    introspection recorded in a manifest. Its `as_view()` returns LazyViews:
+    the initkwargs of the recorded routes are kept in their JSON form and
+    only loaded along with the ViewSet.
+    """
+
+    def __init__(self, import_path, introspection, is_async=False, attributes=None):
+        module, _, name = import_path.rpartition(".")
+        self.__module__ = module
+        self.__name__ = self.__qualname__ = name
+        self.import_path = import_path
+        self.introspection = introspection
+        self.is_async = is_async
+        self.attributes = attributes  # VIEW_ATTRIBUTES of the views, as dumped
+
+    def as_view(self, actions, **initkwargs):
+        return LazyView(
+            self.import_path, actions, initkwargs, self.is_async, self.attributes
+        )
+
+    def __repr__(self):
+        return f"<LazyViewSet {self.import_path}>"
+
+
+def dump_introspection(introspection):
+    return {
+        "routes": [
+            {
+                "url": item.url,
+                "mapping": item.mapping,
+                "name": item.name,
+                "detail": item.detail,
+                "initkwargs": dump_value(item.initkwargs),
+            }
+            for item in introspection.routes
+        ],
+        "mappings": list(introspection.mappings),
+        "lookup": introspection.lookup,
+        "lookup_path": introspection.lookup_path,
+    }
+
+
+def load_introspection(data):
+    return ViewSetIntrospection(
+        routes=tuple(
+            Route(
+                url=item["url"],
+                mapping=item["mapping"],
+                name=item["name"],
+                detail=item["detail"],
+                initkwargs=item["initkwargs"],
+            )
+            for item in data["routes"]
+        ),
+        mappings=tuple(data["mappings"]),
+        lookup=data["lookup"],
+        lookup_path=data["lookup_path"],
+    )
+
+
+class RouteManifest:
+    """
+    The views found by autodiscovery: prefix, import path and basename of
+    each, with the introspection of the ViewSets, so that a later boot can
+    register them without importing anything. The source signatures of the
+    modules the ViewSets and their base classes are defined in are kept
+    along, since the introspection includes inherited actions.
+    """
+
+    def __init__(self, key, routes=None, dependencies=None):
+        self.key = key
+        self.routes = routes if routes is not None else []
+        # Source signature by module name
+        self.dependencies = dependencies if dependencies is not None else {}
+
+    @classmethod
+    def load(cls, filename, key):
+        """
+        Return the manifest stored in `filename`, or None if it is missing,
+        unreadable, was written for other sources or another router, or if a
+        module defining a recorded ViewSet or one of its bases changed.
+        """
+        data = read_json(filename, MANIFEST_VERSION, key)
+        if data is None:
+            return None
+        dependencies = data.get("dependencies")
+        if not isinstance(dependencies, dict) or any(
+            get_source_file_signature(module_name) != signature
+            for module_name, signature in dependencies.items()
+        ):
+            return None
+        return cls(key, data["routes"], dependencies)
+
+    def save(self, filename):
+        """
+        Atomically write the manifest to `filename`.
+        """
+        write_json(
+            filename,
+            {
+                "version": MANIFEST_VERSION,
+                "key": self.key,
+                "routes": self.routes,
+                "dependencies": self.dependencies,
+            },
+        )
+
+    def add(self, prefix, view, import_path, basename, introspection=None):
+        """
+        Record `view`, imported from `import_path` and registered at `prefix`.
+        `introspection` is required for ViewSets.
+        """
+        actions = None
+        if introspection is not None:
+            get_mro_signatures(view, self.dependencies)
+            if introspection.routes:
+                actions = introspection.routes[0].mapping
+        self.routes.append(
+            {
+                "prefix": prefix,
+                "view": import_path,
+                "basename": basename,
+                "async": is_async_view(view),
+                "attributes": dump_view_attributes(view, actions),
+                "viewset": (
+                    dump_introspection(introspection)
+                    if introspection is not None
+                    else None
+                ),
+            }
+        )
+
+    def get_registrations(self):
+        """
+        Return `(prefix, view, basename)` tuples for `register_many()`, with
+        lazy stand-ins for the recorded views.
+        """
+        registrations = []
+        for entry in self.routes:
+            if entry["viewset"] is not None:
+                view = LazyViewSet(
+                    entry["view"],
+                    load_introspection(entry["viewset"]),
+                    is_async=entry["async"],
+                    attributes=entry["attributes"],
+                )
+            else:
+                view = LazyView(
+                    entry["view"],
+                    is_async=entry["async"],
+                    attributes=entry["attributes"],
+                )
+            registrations.append((entry["prefix"], view, entry["basename"]))
+        return registrations
+
+
+def log_manifest_error(filename, error):
+    logger.warning("The route manifest %s cannot be used: %s", filename, error)
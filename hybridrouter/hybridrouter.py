@@ -1,55 +1,258 @@
+import time
 from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from threading import RLock, local
 from typing import Callable, Optional, Type, Union, overload
 
+from django.core.exceptions import ImproperlyConfigured
 from django.urls import include, path, re_path
-from django.urls.exceptions import NoReverseMatch
-from rest_framework.response import Response
-from rest_framework.reverse import reverse
+from django.utils.module_loading import import_string
 from rest_framework.routers import DefaultRouter
 from rest_framework.views import APIView
 from rest_framework.viewsets import ViewSetMixin
 
+from .converters import LOOKUP_CONVERTERS
+from .discovery import (
+    LazyView,
+    LazyViewSet,
+    RouteManifest,
+    get_discovery_defaults,
+    get_source_signature,
+    iter_discovery_modules,
+    log_manifest_error,
+    scan_marked_views,
+)
+from .instrumentation import (
+    InstrumentedResolver,
+    RouteMetrics,
+    instrument_patterns,
+    instrument_view,
+)
+from .introspection import get_viewset_introspection, introspect_viewset
+from .methods import get_allowed_methods, short_circuit_patterns, short_circuit_view
+from .ordering import load_route_profile, order_sibling_blocks
+from .profiling import BuildReport
+from .resolvers import (
+    CachedResolver,
+    DispatchRoute,
+    LazySubtreeResolver,
+    ResolveCache,
+    TreeURLResolver,
+    ViewSetDispatchResolver,
+    ViewSetRoutesResolver,
+    is_literal_segment,
+    prefix_patterns,
+)
+from .reverse import ReverseCache
+from .snapshot import (
+    RouteSnapshot,
+    SnapshotError,
+    get_mro_signatures,
+    get_snapshot_key,
+    iter_url_patterns,
+    log_snapshot_error,
+)
 from .utils import logger
+from .views import APIRootView, AsyncAPIRootView, RouteMetricsView
 
 
 class TreeNode:
-    def __init__(self, name=None):
+    __slots__ = (
+        "name",
+        "_children",
+        "view",
+        "basename",
+        "is_viewset",
+        "is_nested_router",
+        "router",
+        "patterns",
+        "subtree_patterns",
+        "owner",
+    )
+
+    def __init__(self, name=None, owner=None):
         self.name = name
-        self.children = {}
+        self._children = None  # Allocated with the first child, leaves have none
         self.view = None  # Can be a view or a ViewSet
         self.basename = None
         self.is_viewset = False
         self.is_nested_router = False
         self.router = None  # For manually nested routers
+        self.patterns = ()  # URL patterns emitted for this node by the last build
+        self.subtree_patterns = None  # Cached patterns of the subtree, None if stale
+        self.owner = owner  # Token of the router allowed to update it in place
+
+    @property
+    def children(self):
+        """
+        Mapping of path segment -> child node. Accessing it allocates the
+        mapping, internal code uses `get_child()` and `child_items()` instead.
+        """
+        if self._children is None:
+            self._children = {}
+        return self._children
+
+    def has_children(self):
+        return bool(self._children)
+
+    def get_child(self, name):
+        return self._children.get(name) if self._children else None
+
+    def child_items(self):
+        return self._children.items() if self._children else ()
+
+    def child_nodes(self):
+        return self._children.values() if self._children else ()
+
+
+class _PatternCache:
+    """
+    Configuration the patterns cached in the nodes of a tree were built
+    with, shared by the routers derived from one another along with the
+    nodes.
+    """
+
+    __slots__ = ("built_with",)
+
+    def __init__(self):
+        self.built_with = None
+
+
+class Registration:
+    """
+    A single `register()` call, as stored in `HybridRouter.basename_registry`.
+    `basename` is replaced by a unique basename when conflicts are resolved.
+    """
+
+    __slots__ = ("prefix", "view", "basename", "path_parts")
+
+    def __init__(self, prefix, view, basename, path_parts):
+        self.prefix = prefix
+        self.view = view
+        self.basename = basename
+        self.path_parts = path_parts
+
+    def __getitem__(self, key):
+        # Registrations used to be stored as dicts
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
 
 
 class HybridRouter(DefaultRouter):
     include_intermediate_views = True  # Controls intermediate views
     trailing_slash = "/?"  # Define trailing slash as in DRF's SimpleRouter
+    use_tree_resolver = False  # Resolve through the TreeNode tree (TreeURLResolver)
+    api_root_cache_max_age = None  # Cache-Control max-age of API root views
+    use_path_converters = False  # Emit path() instead of re_path() for ViewSets
+    route_snapshot = None  # File caching the resolved ViewSet routes between boots
+    merge_viewset_routes = False  # Match each ViewSet's routes with a single regex
+    instrument_routes = False  # Record hits and latencies in `route_metrics`
+    metrics_prefix = None  # Prefix of the RouteMetricsView, if any
+    route_profile = None  # Hits per route (mapping, RouteMetrics or JSON file)
+    profile_build = False  # Time the build phases in a BuildReport
+    build_report_callback = None  # Called with the BuildReport instead of logging it
+    cache_viewset_routes = False  # Share ViewSet introspection between routers
+    flatten_nested_routers = False  # Inline nested routers' patterns, not include()
+    discovery_manifest = None  # File caching the views found by autodiscover()
+    lazy_subtrees = ()  # Prefixes whose subtree is built by the first request under them
+    async_views = False  # Emit coroutine API root and intermediate views for ASGI
+    short_circuit_methods = False  # Answer 405s and CORS preflights before the view
+    dispatch_viewset_routes = False  # One pattern per ViewSet, with a dispatch table
+    resolve_cache_size = None  # Cache the matches of up to this many static paths
 
     def __init__(self):
         super().__init__()
-        self.root_node = TreeNode()
+        self._node_owner = object()  # Owner of the nodes this router may update
+        self.root_node = TreeNode(owner=self._node_owner)
         self.used_url_names = set()  # Set of used URL names
         self.basename_registry = {}  # Registry for basenames
+        self._unreported_conflicts = set()  # Basenames renamed since the last build
+        self._pattern_cache = _PatternCache()  # Configuration of the cached patterns
+        self._route_snapshot = None  # RouteSnapshot being rebuilt from, if any
+        self.route_metrics = RouteMetrics()  # Filled when instrument_routes is set
+        self.resolve_cache = None  # ResolveCache of the current route table, if any
+        self._route_weights = None  # route_profile loaded for the current build
+        self.build_report = None  # BuildReport of the last build, if profiled
+        self._build_report = None  # BuildReport being filled
+        self._bulk = local()  # Calls deferred by bulk_register(), per thread
+        self._lazy_prefixes = frozenset()  # lazy_subtrees of the current build
+        self._build_lock = RLock()  # Held while building patterns
+        self._api_root_class = APIRootView  # View class of the current build
 
-    def _add_route(self, path_parts, view, basename=None):
-        # Determine if it's a ViewSet or a regular view
-        is_viewset = False
-        if isinstance(view, type):
-            is_viewset = issubclass(view, ViewSetMixin)
-        else:
-            is_viewset = isinstance(view, ViewSetMixin)
-
+    def _get_node(self, path_parts, create=False, stale=True):
+        """
+        Walk the tree along `path_parts` and return the node found there.
+        Unless `stale` is False, every node on the way is marked as stale so
+        the next build re-emits its patterns, while untouched sibling subtrees
+        keep their cache. The nodes marked are first copied if they are
+        shared with another router (see `derive()`).
+        """
+        if stale:
+            self.root_node = self._own_node(self.root_node)
+            self.root_node.subtree_patterns = None
         node = self.root_node
         for part in path_parts:
-            if part not in node.children:
-                node.children[part] = TreeNode(name=part)
-            node = node.children[part]
+            child = node.get_child(part)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[part] = TreeNode(part, self._node_owner)
+            elif stale and child.owner is not self._node_owner:
+                child = node.children[part] = self._copy_node(child)
+            node = child
+            if stale:
+                node.subtree_patterns = None
+        return node
+
+    def _copy_node(self, node):
+        """
+        Return a copy of `node` owned by this router, sharing its children.
+        """
+        copy = TreeNode(node.name, self._node_owner)
+        copy._children = dict(node._children) if node._children else None
+        copy.view = node.view
+        copy.basename = node.basename
+        copy.is_viewset = node.is_viewset
+        copy.is_nested_router = node.is_nested_router
+        copy.router = node.router
+        copy.patterns = node.patterns
+        copy.subtree_patterns = node.subtree_patterns
+        return copy
+
+    def _own_node(self, node):
+        if node.owner is self._node_owner:
+            return node
+        return self._copy_node(node)
 
+    def _add_route(self, path_parts, view, basename=None):
+        node = self._get_node(path_parts, create=True)
         node.view = view
         node.basename = basename
-        node.is_viewset = is_viewset
+        node.is_viewset = self._is_viewset(view)
+        return node
+
+    def _is_viewset(self, view):
+        # Determine if it's a ViewSet or a regular view. Views registered by
+        # import path are only known once imported, when they are built.
+        if isinstance(view, type):
+            return issubclass(view, ViewSetMixin)
+        return isinstance(view, (ViewSetMixin, LazyViewSet))
+
+    def get_default_basename(self, viewset):
+        """
+        Return the basename of `viewset` derived from its queryset, as DRF
+        does. A view given by its import path has to be registered with a
+        basename, since it would take importing it.
+        """
+        if isinstance(viewset, (str, LazyView, LazyViewSet)):
+            raise ImproperlyConfigured(
+                f"Cannot determine the basename of {viewset!r} without "
+                "importing it, register it with a `basename`."
+            )
+        return super().get_default_basename(viewset)
 
     @overload
     def register(
@@ -69,10 +272,16 @@ class HybridRouter(DefaultRouter):
     ) -> None:
         ...  # pragma: no cover
 
+    @overload
+    def register(
+        self, prefix: str, viewset: str, basename: Optional[str] = None
+    ) -> None:
+        ...  # pragma: no cover
+
     def register(
         self,
         prefix: str,
-        viewset: Union[Type[APIView], Type[ViewSetMixin], Type[Callable]],
+        viewset: Union[Type[APIView], Type[ViewSetMixin], Type[Callable], str],
         basename: Optional[str] = None,
     ) -> None:
         """
@@ -80,122 +289,794 @@ class HybridRouter(DefaultRouter):
 
         Args:
             prefix (str): URL prefix for the view or viewset.
-            viewset (Type[APIView] or Type[ViewSetMixin] or Type[Callable]):
-                A class (APIView or ViewSet) or function (@api_view-decorated function).
+            viewset (Type[APIView] or Type[ViewSetMixin] or Type[Callable] or str):
+                A class (APIView or ViewSet) or function (@api_view-decorated function),
+                or its dotted import path. A view given by path is imported when
+                its prefix is built, and needs a basename.
             basename (str, optional): The base name for the view or viewset. Defaults to None.
+
+        Raises:
+            ImproperlyConfigured: If a view given by its import path has no
+                basename.
+        """
+        with self._build_lock:
+            if self._bulk_registrations is not None:
+                self._bulk_registrations.append(("view", prefix, viewset, basename))
+                return
+            if basename is None:
+                basename = self.get_default_basename(viewset)
+            path_parts = tuple(prefix.strip("/").split("/"))
+            label = "/".join(path_parts)
+
+            # Register the information for conflict resolution
+            if basename not in self.basename_registry:
+                self.basename_registry[basename] = []
+            self.basename_registry[basename].append(
+                Registration(prefix, viewset, basename, path_parts)
+            )
+            with self._measure("tree", label):
+                self._add_route(path_parts, viewset, basename=basename)
+            with self._measure("conflicts", label):
+                self._resolve_basename_conflicts(basename)
+            self._invalidate_urls()
+
+    def register_many(self, registrations):
+        """
+        Registers several views at once, validating all of them first.
+
+        Args:
+            registrations: An iterable of `(prefix, view)` or
+                `(prefix, view, basename)` tuples, or a mapping of prefix to
+                view or to `(view, basename)`.
+
+        Raises:
+            ImproperlyConfigured: If an entry is not a view, ViewSet or
+                @api_view-decorated function, has no basename and none can be
+                determined, or uses a prefix that is already registered. In
+                that case nothing is registered.
+        """
+        entries = self._get_view_entries(registrations)
+        with self._build_lock:
+            if self._bulk_registrations is not None:
+                self._bulk_registrations.extend(entries)
+            else:
+                self._register_bulk(entries)
+
+    def _get_view_entries(self, registrations):
+        """
+        Return the `register_many()` arguments as `("view", prefix, view,
+        basename)` entries for `_register_bulk()`.
+        """
+        if isinstance(registrations, Mapping):
+            registrations = [
+                (prefix, *value) if isinstance(value, tuple) else (prefix, value)
+                for prefix, value in registrations.items()
+            ]
+        entries = []
+        for item in registrations:
+            if not isinstance(item, (tuple, list)) or not 2 <= len(item) <= 3:
+                raise ImproperlyConfigured(
+                    f"Invalid registration {item!r}, expected (prefix, view) or "
+                    "(prefix, view, basename)."
+                )
+            entries.append(
+                ("view", item[0], item[1], item[2] if len(item) == 3 else None)
+            )
+        return entries
+
+    def derive(self, overrides=None, remove=()):
+        """
+        Return a new version of the router: the same registrations and
+        settings, but with the views at the `remove` prefixes unregistered
+        along with everything under them, and the `overrides` registered,
+        replacing the views already registered at their prefixes.
+
+        The versions share the subtrees that did not change, their cached
+        patterns and view functions included, and each one copies a shared
+        node before updating it. Deriving a router therefore costs in memory
+        and build time what differs from it. A version built with other
+        settings copies the whole tree.
+
+        Args:
+            overrides: Registrations, in any form `register_many()` accepts.
+            remove: Prefixes to unregister.
+
+        Raises:
+            ImproperlyConfigured: If nothing is registered at a prefix of
+                `remove`, or for an invalid override, as `register_many()`
+                does.
         """
-        if basename is None:
-            basename = self.get_default_basename(viewset)
-        path_parts = prefix.strip("/").split("/")
-
-        # Register the information for conflict resolution
-        if basename not in self.basename_registry:
-            self.basename_registry[basename] = []
-        self.basename_registry[basename].append(
-            {
-                "prefix": prefix,
-                "view": viewset,
-                "basename": basename,
-                "path_parts": path_parts,
+        entries = self._get_view_entries(overrides or ())
+        with self._build_lock:
+            if self._bulk_registrations is not None:
+                raise ImproperlyConfigured(
+                    "Cannot derive a router inside its bulk_register() block."
+                )
+            derived = type(self)()
+            for name, value in vars(self).items():
+                # Settings assigned to this instance
+                if not name.startswith("_") and hasattr(type(self), name):
+                    setattr(derived, name, value)
+            # Neither router may update the nodes they now share in place
+            self._node_owner = object()
+            derived.root_node = self.root_node
+            derived._pattern_cache = self._pattern_cache
+            derived.basename_registry = {
+                basename: list(registrations)
+                for basename, registrations in self.basename_registry.items()
             }
-        )
+        for prefix in remove:
+            derived._unregister(prefix, subtree=True)
+        for _kind, prefix, _view, _basename in entries:
+            if isinstance(prefix, str):
+                derived._unregister(prefix, subtree=False)
+        derived._register_bulk(entries)
+        return derived
+
+    def _unregister(self, prefix, subtree):
+        """
+        Remove the view or nested router registered at `prefix` and its
+        registrations, with everything under it if `subtree` is True, along
+        with the parent nodes left empty. Only the removal of a subtree
+        requires something to be there. The basenames of the registrations
+        left are renumbered as if the removed ones had never been made.
+        """
+        path_parts = tuple(prefix.strip("/").split("/"))
+        with self._build_lock:
+            node = self._get_node(path_parts, stale=False)
+            if node is None or path_parts == ("",):
+                if subtree:
+                    raise ImproperlyConfigured(
+                        f"Cannot remove {prefix!r}: nothing is registered there."
+                    )
+                return
+            if subtree:
+                del self._get_node(path_parts[:-1]).children[path_parts[-1]]
+                # Drop the intermediate nodes that led only there
+                parts = path_parts[:-1]
+                while parts:
+                    node = self._get_node(parts, stale=False)
+                    if node.has_children() or node.view or node.is_nested_router:
+                        break
+                    del self._get_node(parts[:-1]).children[parts[-1]]
+                    parts = parts[:-1]
+            else:
+                node = self._get_node(path_parts)
+                node.view = node.basename = node.router = None
+                node.is_viewset = node.is_nested_router = False
+                node.patterns = ()
+            depth = len(path_parts)
+            for basename, registrations in list(self.basename_registry.items()):
+                kept = [
+                    reg
+                    for reg in registrations
+                    if (reg.path_parts[:depth] if subtree else reg.path_parts)
+                    != path_parts
+                ]
+                if len(kept) == len(registrations):
+                    continue
+                if kept:
+                    self.basename_registry[basename] = kept
+                    self._renumber_basename(basename)
+                else:
+                    del self.basename_registry[basename]
+            self._invalidate_urls()
+
+    def _renumber_basename(self, basename):
+        """
+        Give the registrations of `basename` the unique basenames a router
+        with only them would give, after some of them were removed.
+        """
+        registrations = self.basename_registry[basename]
+        unique = len(registrations) < 2
+        for idx, reg in enumerate(registrations, start=1):
+            new_basename = basename if unique else f"{basename}_{idx}"
+            if reg.basename == new_basename:
+                continue
+            registrations[idx - 1] = Registration(
+                reg.prefix, reg.view, new_basename, reg.path_parts
+            )
+            node = self._get_node(reg.path_parts)
+            if node is not None and node.view is reg.view:
+                node.basename = new_basename
+
+    @contextmanager
+    def bulk_register(self):
+        """
+        Defer the `register()`, `register_many()` and `register_nested_router()`
+        calls made in the block and apply them at once when it exits, as a
+        single `register_many()`. If the block raises, or if an entry is
+        invalid, nothing is registered. Only the calls made by the thread
+        running the block are deferred.
+        """
+        if self._bulk_registrations is not None:
+            # Nested blocks are part of the outer one
+            yield self
+            return
+        self._bulk_registrations = []
+        try:
+            yield self
+            entries = self._bulk_registrations
+        finally:
+            self._bulk_registrations = None
+        self._register_bulk(entries)
+
+    @property
+    def _bulk_registrations(self):
+        # Calls deferred by the bulk_register() block of the current thread
+        return getattr(self._bulk, "entries", None)
+
+    @_bulk_registrations.setter
+    def _bulk_registrations(self, entries):
+        self._bulk.entries = entries
+
+    def _is_view(self, view):
+        if isinstance(view, type):
+            return issubclass(view, (APIView, ViewSetMixin))
+        if isinstance(view, str):
+            return bool(view.rpartition(".")[0])  # Import path, checked when built
+        return isinstance(view, (ViewSetMixin, LazyViewSet)) or callable(view)
+
+    def _register_bulk(self, entries):
+        """
+        Validate and apply deferred registrations: the prefixes are checked
+        against each other and against the tree, the tree is updated once per
+        entry and the basename conflicts once per basename.
+        """
+        with self._build_lock:
+            errors = []
+            registrations = []
+            seen_prefixes = set()
+            for kind, prefix, view, basename in entries:
+                if not isinstance(prefix, str):
+                    errors.append(f"{prefix!r}: the prefix must be a string")
+                    continue
+                label = prefix.strip("/")
+                if label in seen_prefixes:
+                    errors.append(f"{prefix}: registered more than once")
+                    continue
+                seen_prefixes.add(label)
+                path_parts = tuple(label.split("/"))
+                existing = self._get_node(path_parts, stale=False)
+                if existing is not None and (
+                    existing.view or existing.is_nested_router
+                ):
+                    errors.append(f"{prefix}: already registered")
+                    continue
+                if kind == "view":
+                    if not self._is_view(view):
+                        errors.append(
+                            f"{prefix}: {view!r} is not a view, ViewSet or "
+                            "@api_view-decorated function"
+                        )
+                        continue
+                    if basename is None:
+                        try:
+                            basename = self.get_default_basename(view)
+                        except (
+                            AssertionError,
+                            AttributeError,
+                            ImproperlyConfigured,
+                        ) as e:
+                            errors.append(f"{prefix}: {e}")
+                            continue
+                registrations.append((kind, prefix, view, basename, path_parts, label))
+            if errors:
+                raise ImproperlyConfigured(
+                    "Invalid registrations, nothing was registered:\n- "
+                    + "\n- ".join(errors)
+                )
+
+            report = self._get_build_report()
+            registry = self.basename_registry
+            added = {}  # basename -> [new registrations, prefix of the last one]
+            # Parent nodes reached by this batch, starting from the stale root
+            parents = {(): self._get_node(())}
+            for kind, prefix, view, basename, path_parts, label in registrations:
+                if report is not None:
+                    start = time.perf_counter()
+                # Only walk the part of the tree that this batch has not reached,
+                # the nodes on the way are marked as stale when first reached.
+                parent_parts = path_parts[:-1]
+                node = parents.get(parent_parts)
+                if node is None:
+                    depth = len(parent_parts) - 1
+                    while parent_parts[:depth] not in parents:
+                        depth -= 1
+                    node = parents[parent_parts[:depth]]
+                    for depth in range(depth + 1, len(parent_parts) + 1):
+                        node = self._get_child_node(node, parent_parts[depth - 1])
+                        parents[parent_parts[:depth]] = node
+                node = self._get_child_node(node, path_parts[-1])
+                if kind == "router":
+                    node.is_nested_router = True
+                    node.router = view
+                else:
+                    registry.setdefault(basename, []).append(
+                        Registration(prefix, view, basename, path_parts)
+                    )
+                    node.view = view
+                    node.basename = basename
+                    node.is_viewset = self._is_viewset(view)
+                    counter = added.get(basename)
+                    if counter is None:
+                        added[basename] = [1, label]
+                    else:
+                        counter[0] += 1
+                        counter[1] = label
+                if report is not None:
+                    report.record("tree", label, time.perf_counter() - start)
+            for basename, (count, label) in added.items():
+                if len(registry[basename]) < 2:
+                    continue  # Unique basename, nothing to resolve
+                with self._measure("conflicts", label):
+                    self._resolve_basename_conflicts(basename, added=count)
+            self._invalidate_urls()
+
+    def _get_child_node(self, node, name):
+        child = node.get_child(name)
+        if child is None:
+            child = node.children[name] = TreeNode(name, self._node_owner)
+        elif child.owner is not self._node_owner:
+            child = node.children[name] = self._copy_node(child)
+        child.subtree_patterns = None
+        return child
 
     def register_nested_router(self, prefix, router):
         """
         Registers a nested router under a certain prefix.
         """
-        node = self.root_node
-        path_parts = prefix.strip("/").split("/")
-        for part in path_parts:
-            if part not in node.children:
-                node.children[part] = TreeNode(name=part)
-            node = node.children[part]
-        node.is_nested_router = True
-        node.router = router
-
-    def _resolve_basename_conflicts(self):
-        """
-        Resolve basename conflicts by assigning unique basenames
-        and displaying a single warning message per conflicting basename.
-        """
-        for basename, registrations in self.basename_registry.items():
-            if len(registrations) > 1:
-                # Conflict detected
-                prefixes = [reg["prefix"] for reg in registrations]
-                logger.warning(
-                    "The basename '%s' is used for multiple registrations: %s. Generating unique basenames.",
-                    basename,
-                    ", ".join(prefixes),
-                )
-                # Assign new unique basenames
-                for idx, reg in enumerate(registrations, start=1):
-                    unique_basename = f"{basename}_{idx}"
-                    reg["basename"] = unique_basename
-            # Else, the basename is unique, no need to change it
+        with self._build_lock:
+            if self._bulk_registrations is not None:
+                self._bulk_registrations.append(("router", prefix, router, None))
+                return
+            path_parts = prefix.strip("/").split("/")
+            node = self._get_node(path_parts, create=True)
+            node.is_nested_router = True
+            node.router = router
+            self._invalidate_urls()
+
+    def autodiscover(self, modules=None, manifest=None):
+        """
+        Registers the views marked with `hybridrouter.discovery.route()`, or
+        with a `hybridrouter_routes` attribute, in the `modules` submodules
+        of every installed app.
+
+        Args:
+            modules: Names of the submodules to scan, `views` and `viewsets`
+                or the HYBRIDROUTER_DISCOVERY_MODULES setting by default.
+            manifest: File caching what was found, `discovery_manifest` or
+                the HYBRIDROUTER_DISCOVERY_MANIFEST setting by default. While
+                the scanned modules are unchanged, the views are registered
+                from it without importing anything: each view is imported
+                by the first request that resolves to it.
+        """
+        default_modules, default_manifest = get_discovery_defaults()
+        modules = tuple(modules if modules is not None else default_modules)
+        if manifest is None:
+            manifest = self.discovery_manifest or default_manifest
+        if manifest:
+            key = self._get_manifest_key(modules)
+            route_manifest = RouteManifest.load(manifest, key)
+            if route_manifest is not None:
+                try:
+                    registrations = route_manifest.get_registrations()
+                except (KeyError, TypeError) as e:
+                    log_manifest_error(manifest, e)
+                else:
+                    self.register_many(registrations)
+                    return
+
+        found = scan_marked_views(modules)
+        self.register_many([item[:3] for item in found])
+        if not manifest:
+            return
+        route_manifest = RouteManifest(key)
+        try:
+            for prefix, view, basename, import_path in found:
+                if basename is None:
+                    basename = self.get_default_basename(view)
+                introspection = None
+                if self._is_viewset(view):
+                    introspection = introspect_viewset(self, view)
+                route_manifest.add(prefix, view, import_path, basename, introspection)
+            route_manifest.save(manifest)
+        except (OSError, SnapshotError) as e:
+            log_manifest_error(manifest, e)
+
+    def _get_manifest_key(self, modules):
+        """
+        Hash everything a discovery manifest depends on: the scanned modules'
+        source files and the router's routes, which the recorded ViewSet
+        introspection is made of.
+        """
+        return get_snapshot_key(
+            [
+                f"{type(self).__module__}.{type(self).__qualname__}",
+                repr(self.routes),
+                list(modules),
+                [
+                    [name, get_source_signature(spec)]
+                    for name, spec in iter_discovery_modules(modules)
+                ],
+            ]
+        )
+
+    def _get_build_report(self):
+        """
+        Return the pending BuildReport, or None if the build is not profiled.
+        """
+        if self._build_report is None and self.profile_build:
+            self._build_report = BuildReport()
+        return self._build_report
+
+    def _measure(self, phase, label):
+        """
+        Time the enclosed block in the pending BuildReport, if the build is
+        profiled.
+        """
+        report = self._get_build_report()
+        if report is None:
+            return nullcontext()
+        return report.measure(phase, label)
+
+    def _finish_build_report(self, report, total):
+        """
+        Close the pending BuildReport, which took `total` seconds, keep it as
+        `build_report` and emit it.
+        """
+        self._build_report = None
+        report.total = total
+        self.build_report = report
+        self._emit_build_report(report)
+
+    def _emit_build_report(self, report):
+        if self.build_report_callback is not None:
+            self.build_report_callback(report)
+        else:
+            logger.info(report.format())
+
+    def _invalidate_urls(self):
+        """
+        Drop the memoized route table so the next access to `urls` rebuilds it.
+        """
+        self.__dict__.pop("_urls", None)
+
+    def _resolve_basename_conflicts(self, basename, added=1):
+        """
+        Resolve basename conflicts for `basename` by assigning unique basenames
+        to its registrations, the last `added` of which are new. Only the
+        registrations whose basename actually changes are touched, and a
+        single warning message per conflicting basename is displayed at the
+        next build.
+        """
+        registrations = self.basename_registry[basename]
+        if len(registrations) < 2:
+            # The basename is unique, no need to change it
+            return
+        # Conflict detected: the first registration is renamed along with the
+        # new ones if it was unique so far, otherwise only the new ones need
+        # their own unique basename.
+        previous = len(registrations) - added
+        start = 1 if previous < 2 else previous + 1
+        for idx, reg in enumerate(registrations[start - 1 :], start=start):
+            unique_basename = f"{basename}_{idx}"
+            # Replaced rather than updated: derived routers share registrations
+            registrations[idx - 1] = Registration(
+                reg.prefix, reg.view, unique_basename, reg.path_parts
+            )
+            node = self._get_node(reg.path_parts)
+            if node is not None and node.view is reg.view:
+                node.basename = unique_basename
+        self._unreported_conflicts.add(basename)
+
+    def _report_basename_conflicts(self):
+        for basename in self._unreported_conflicts:
+            prefixes = [reg.prefix for reg in self.basename_registry[basename]]
+            logger.warning(
+                "The basename '%s' is used for multiple registrations: %s. Generating unique basenames.",
+                basename,
+                ", ".join(prefixes),
+            )
+        self._unreported_conflicts.clear()
+
+    def _get_build_config(self):
+        """
+        Return the router settings the generated patterns depend on. Changing
+        any of them after a build discards every cached subtree.
+        """
+        return (
+            self.trailing_slash,
+            tuple(sorted(self._lazy_prefixes)),
+            self._api_root_class,
+            self.include_intermediate_views,
+            self.api_root_cache_max_age,
+            self.use_path_converters,
+            self.merge_viewset_routes,
+            self.dispatch_viewset_routes,
+            self.instrument_routes,
+            self.short_circuit_methods,
+            self.flatten_nested_routers,
+            tuple(sorted(self._route_weights.items())) if self._route_weights else None,
+        )
+
+    def _clear_subtree_patterns(self, node):
+        node.subtree_patterns = None
+        for child in node.child_nodes():
+            self._clear_subtree_patterns(child)
 
     def get_urls(self):
-        # Before building the URLs, resolve basename conflicts
-        self._resolve_basename_conflicts()
-        # Build the tree by calling _add_route for each registration
-        for registrations in self.basename_registry.values():
-            for reg in registrations:
-                self._add_route(
-                    reg["path_parts"], reg["view"], basename=reg["basename"]
+        """
+        Build the route table. Only the stale subtrees are regenerated, under
+        the build lock so that concurrent builds and registrations do not
+        interleave.
+        """
+        with self._build_lock:
+            self._report_basename_conflicts()
+            self._route_weights = load_route_profile(self.route_profile)
+            self._lazy_prefixes = frozenset(
+                prefix.strip("/")
+                for prefix in self.lazy_subtrees
+                if is_literal_segment(prefix.strip("/"))
+            )
+            self._api_root_class = self._get_api_root_class()
+            build_config = self._get_build_config()
+            # Instrumented patterns record in the metrics of their router
+            built_with = (
+                build_config,
+                self.route_metrics if self.instrument_routes else None,
+            )
+            if built_with != self._pattern_cache.built_with:
+                if self._pattern_cache.built_with is not None:
+                    # Routers sharing nodes keep the patterns they cache
+                    self._unshare_tree()
+                self._clear_subtree_patterns(self.root_node)
+                self._pattern_cache.built_with = built_with
+                if self.route_snapshot:
+                    return self._get_urls_from_snapshot()
+            # Now, build the URLs, only the stale subtrees are regenerated
+            urls = []
+            self._build_urls(self.root_node, "", urls)
+            return urls
+
+    def _unshare_tree(self):
+        """
+        Copy the nodes shared with other routers, so that their patterns can
+        be rebuilt with another configuration.
+        """
+
+        def own(node):
+            node = self._own_node(node)
+            for name, child in node.child_items():
+                node._children[name] = own(child)
+            return node
+
+        self.root_node = own(self.root_node)
+        self._pattern_cache = _PatternCache()
+
+    def _iter_nodes(self, node=None, prefix=""):
+        """
+        Yield `(prefix, node)` for every node of the tree, depth first.
+        """
+        node = node or self.root_node
+        yield prefix, node
+        for child in node.child_nodes():
+            yield from self._iter_nodes(child, f"{prefix}{child.name}/")
+
+    def _get_snapshot_key(self):
+        """
+        Hash everything the resolved routes depend on: the registrations, the
+        source files of the registered views and of their base classes, and
+        the router configuration.
+        """
+        items = [
+            list(self._get_build_config()),
+            f"{type(self).__module__}.{type(self).__qualname__}",
+            repr(self.routes),
+        ]
+        signatures = {}  # Source signature by module name
+        for prefix, node in self._iter_nodes():
+            if node.view is not None:
+                if isinstance(node.view, str):
+                    view_path = node.view
+                else:
+                    view_path = f"{node.view.__module__}.{node.view.__qualname__}"
+                items.append(
+                    [
+                        prefix,
+                        view_path,
+                        node.basename,
+                        get_mro_signatures(node.view, signatures),
+                    ]
                 )
-        # Now, build the URLs
+        return get_snapshot_key(items)
+
+    def _get_urls_from_snapshot(self):
+        """
+        Full build using the `route_snapshot` file: the ViewSet routes are
+        rebuilt from it when it matches the registrations, otherwise they are
+        introspected and the snapshot is written for the next boot.
+        """
+        key = self._get_snapshot_key()
+        snapshot = RouteSnapshot.load(self.route_snapshot, key)
+        if snapshot is not None:
+            self._route_snapshot = snapshot
+            try:
+                urls = []
+                self._build_urls(self.root_node, "", urls)
+                return urls
+            except (ImportError, KeyError, TypeError, SnapshotError) as e:
+                log_snapshot_error(self.route_snapshot, e)
+                self._clear_subtree_patterns(self.root_node)
+            finally:
+                self._route_snapshot = None
+
         urls = []
         self._build_urls(self.root_node, "", urls)
+        snapshot = RouteSnapshot(key)
+        try:
+            for prefix, node in self._iter_nodes():
+                if node.view is None or isinstance(node.view, LazyViewSet):
+                    continue  # Lazy ViewSets are rebuilt from their manifest
+                if (
+                    node.is_viewset
+                    and self._is_built(node)
+                    and not isinstance(node.patterns[0], ViewSetDispatchResolver)
+                ):
+                    # Dispatched ViewSets create their views on demand
+                    view = node.view
+                    if isinstance(view, str):
+                        view = import_string(view)
+                    snapshot.add_viewset(prefix, view, node.patterns)
+            snapshot.save(self.route_snapshot)
+        except (OSError, SnapshotError) as e:
+            log_snapshot_error(self.route_snapshot, e)
         return urls
 
-    def _build_urls(self, node, prefix, urls):
+    def _build_urls(self, node, prefix, urls, defer=True):
+        if node.subtree_patterns is not None:
+            urls.extend(node.subtree_patterns)
+            return
+        if defer and self._lazy_prefixes and prefix[:-1] in self._lazy_prefixes:
+            resolver = LazySubtreeResolver(
+                prefix, partial(self._build_lazy_subtree, node, prefix)
+            )
+            node.patterns = node.subtree_patterns = (resolver,)
+            urls.append(resolver)
+            return
+        start = len(urls)
+        node_urls = []
         # If there's a view at this node, add it
         if node.view:
+            view = node.view
+            if isinstance(view, str):
+                view = import_string(view)
+                node.is_viewset = self._is_viewset(view)
             if node.is_viewset:
-                # Generate URL patterns directly for the ViewSet
-                viewset_urls = self._get_viewset_urls(node.view, prefix, node.basename)
-                urls.extend(viewset_urls)
+                viewset_urls = None
+                if self._route_snapshot is not None and not isinstance(
+                    view, LazyViewSet
+                ):
+                    with self._measure("snapshot", prefix.rstrip("/")):
+                        viewset_urls = self._route_snapshot.get_viewset_urls(
+                            view, prefix
+                        )
+                if viewset_urls is None:
+                    # Generate URL patterns directly for the ViewSet
+                    viewset_urls = self._get_viewset_urls(view, prefix, node.basename)
+                if self.merge_viewset_routes and len(viewset_urls) > 1:
+                    merged = ViewSetRoutesResolver.merge(viewset_urls)
+                    if merged is not None:
+                        viewset_urls = [merged]
+                node_urls.extend(viewset_urls)
             else:
                 name = f"{node.basename}"
                 # Only APIView has as_view, so try that first
-                try:
-                    urls.append(path(f"{prefix}", node.view.as_view(), name=name))
-                except AttributeError:
-                    # That didn't work, so it must be an @api_view-decorated function.
-                    urls.append(path(f"{prefix}", node.view, name=name))
+                as_view = getattr(view, "as_view", None)
+                if as_view is not None:
+                    with self._measure("as_view", prefix.rstrip("/")):
+                        view = as_view()
+                # Otherwise it must be an @api_view-decorated function.
+                node_urls.append(path(f"{prefix}", view, name=name))
         # If this node is a nested router, include it
         elif node.is_nested_router:
-            urls.append(
-                path(
-                    f"{prefix}",
-                    include(node.router.urls),
+            nested_urls = None
+            if self.flatten_nested_routers:
+                # Only the patterns are inlined, the nested registrations stay
+                # out of the tree: intermediate views and basename conflict
+                # resolution still see the nested router as a whole
+                nested_urls = prefix_patterns(node.router.urls, prefix)
+            if nested_urls is not None:
+                node_urls.extend(nested_urls)
+            else:
+                node_urls.append(
+                    path(
+                        f"{prefix}",
+                        include(node.router.urls),
+                    )
                 )
-            )
-        # Process child nodes
-        if node.children:
-            # Include intermediate views if enabled and there's no view at this node
-            if (
-                self.include_intermediate_views
-                and not node.view
-                and not node.is_nested_router
-            ):
-                if prefix:
+        # Include intermediate views if enabled and there's no view at this node
+        if (
+            node.has_children()
+            and self.include_intermediate_views
+            and not node.view
+            and not node.is_nested_router
+        ):
+            if prefix:
+                with self._measure("intermediate_views", prefix.rstrip("/")):
                     api_root_view = self._get_api_root_view(node, prefix)
-                    if api_root_view:
-                        urls.append(path(f"{prefix}", api_root_view))
-            for child in node.children.values():
+                if api_root_view:
+                    node_urls.append(path(f"{prefix}", api_root_view))
+        if self.short_circuit_methods:
+            short_circuit_patterns(node_urls)
+        if self.instrument_routes:
+            instrument_patterns(node_urls, self.route_metrics)
+        node.patterns = tuple(node_urls)
+        urls.extend(node_urls)
+        if not node.has_children():
+            # The subtree of a leaf is the leaf itself, share its patterns
+            node.subtree_patterns = node.patterns
+            return
+        # Process child nodes
+        if not self._route_weights:
+            for child in node.child_nodes():
                 child_prefix = f"{prefix}{child.name}/"
                 self._build_urls(child, child_prefix, urls)
+        else:
+            # Build each child apart so that the hottest subtrees come first
+            blocks = []
+            for child in node.child_nodes():
+                child_prefix = f"{prefix}{child.name}/"
+                child_urls = []
+                self._build_urls(child, child_prefix, child_urls)
+                blocks.append((child, child_prefix, child_urls))
+            for child_urls in order_sibling_blocks(blocks, self._route_weights):
+                urls.extend(child_urls)
+        node.subtree_patterns = tuple(urls[start:])
+
+    def _is_built(self, node):
+        """
+        Return True if `node` has patterns, False if it has none or if they
+        are deferred by `lazy_subtrees` and not built yet.
+        """
+        if not node.patterns:
+            return False
+        return not isinstance(node.patterns[0], LazySubtreeResolver)
+
+    def _build_lazy_subtree(self, node, prefix):
+        """
+        Build the patterns of a subtree listed in `lazy_subtrees`, importing
+        the views registered by path, on the first request under it.
+        """
+        with self._build_lock:
+            node.subtree_patterns = None
+            urls = []
+            self._build_urls(node, prefix, urls, defer=False)
+        return urls
 
     def _get_viewset_urls(self, viewset, prefix, basename):
         """
         Génère les URL patterns pour un ViewSet sans utiliser de sous-routeur.
         """
-        routes = self.get_routes(viewset)
+        label = prefix.rstrip("/")
+        with self._measure("introspection", label):
+            if isinstance(viewset, LazyViewSet):
+                introspection = viewset.introspection
+            elif self.cache_viewset_routes:
+                introspection = get_viewset_introspection(self, viewset)
+            else:
+                introspection = introspect_viewset(self, viewset)
+        if self.dispatch_viewset_routes:
+            dispatcher = self._get_viewset_dispatcher(
+                viewset, prefix, basename, introspection
+            )
+            if dispatcher is not None:
+                return [dispatcher]
+        lookup = introspection.lookup
+        lookup_path = introspection.lookup_path if self.use_path_converters else None
         urls = []
-        lookup = self.get_lookup_regex(viewset)
 
-        for route in routes:
-            mapping = self.get_method_map(viewset, route.mapping)
+        for route, mapping in zip(introspection.routes, introspection.mappings):
             if not mapping:
                 continue
 
@@ -207,16 +1088,154 @@ class HybridRouter(DefaultRouter):
             )
 
             # Générer la vue
-            view = viewset.as_view(mapping, **route.initkwargs)
+            with self._measure("as_view", label):
+                view = viewset.as_view(mapping, **route.initkwargs)
 
             # Générer le nom de l'URL
             name = route.name.format(basename=basename) if route.name else None
 
-            # Ajouter le pattern URL
-            urls.append(re_path(regex, view, name=name))
+            # Ajouter le pattern URL, avec path() quand la route le permet
+            route_path = (
+                self._get_route_path(route.url, prefix, lookup_path)
+                if self.use_path_converters
+                else None
+            )
+            if route_path is not None:
+                urls.append(path(route_path, view, name=name))
+            else:
+                urls.append(re_path(regex, view, name=name))
 
         return urls
 
+    def _get_viewset_dispatcher(self, viewset, prefix, basename, introspection):
+        """
+        Return a ViewSetDispatchResolver matching the routes of `viewset`, or
+        None if its prefix, lookup regex or the trailing slash need the
+        regular patterns.
+        """
+        stem = prefix.rstrip("/")
+        if (
+            not stem
+            or not is_literal_segment(stem)
+            or introspection.lookup_path is None  # The lookup may match "/"
+            or self.trailing_slash not in ("/?", "/", "")
+        ):
+            return None
+        routes = []
+        views = []
+        for route, mapping in zip(introspection.routes, introspection.mappings):
+            if not mapping:
+                continue
+            regex = route.url.format(
+                prefix=stem,
+                lookup=introspection.lookup,
+                trailing_slash=self.trailing_slash,
+            )
+            name = route.name.format(basename=basename) if route.name else None
+            suffix, detail = self._get_route_suffix(route.url)
+            routes.append(DispatchRoute(regex, name, suffix, detail))
+            views.append((mapping, route.initkwargs))
+        make_view = partial(
+            self._make_dispatched_view,
+            viewset,
+            routes,
+            views,
+            self.short_circuit_methods,
+            self.route_metrics if self.instrument_routes else None,
+        )
+        return ViewSetDispatchResolver(
+            prefix, routes, introspection.lookup, self.trailing_slash, make_view
+        )
+
+    def _get_route_suffix(self, route_url):
+        """
+        Return the literal part of a DRF `Route.url` regex template following
+        the prefix and, for detail routes, the lookup, along with whether it
+        follows the lookup. The suffix is None if it is not a literal.
+        """
+        placeholders = prefix_placeholder, lookup_placeholder, slash_placeholder = (
+            "\x00",
+            "\x01",
+            "\x02",
+        )
+        body = route_url.format(
+            prefix=prefix_placeholder,
+            lookup=lookup_placeholder,
+            trailing_slash=slash_placeholder,
+        )
+        head, tail = f"^{prefix_placeholder}", f"{slash_placeholder}$"
+        if not (body.startswith(head) and body.endswith(tail)):
+            return None, False
+        body = body[len(head) : -len(tail)]
+        detail = body.startswith(f"/{lookup_placeholder}")
+        if detail:
+            body = body[2:]
+        if not body:
+            return "", detail
+        if (
+            len(body) < 2
+            or body[0] != "/"
+            or not is_literal_segment(body)
+            or any(placeholder in body for placeholder in placeholders)
+        ):
+            return None, detail
+        return body[1:], detail
+
+    def _make_dispatched_view(
+        self, viewset, routes, views, short_circuit, route_metrics, idx
+    ):
+        """
+        Create the view of the route `idx` of a ViewSetDispatchResolver,
+        wrapped as the patterns of the other ViewSets are.
+        """
+        mapping, initkwargs = views[idx]
+        view = viewset.as_view(mapping, **initkwargs)
+        if short_circuit:
+            allowed = get_allowed_methods(view)
+            if allowed is not None:
+                view = short_circuit_view(view, allowed)
+        if route_metrics is not None:
+            route = routes[idx]
+            view = instrument_view(view, route_metrics, route.name or route.regex)
+        return view
+
+    def _get_route_path(self, route_url, prefix, lookup_path):
+        """
+        Translate a DRF `Route.url` regex template into a `path()` route.
+
+        Returns None when the route cannot be expressed without a regex: a
+        prefix or url_path containing regex syntax, an unsupported lookup
+        regex or trailing slash. The optional "/?" trailing slash keeps the
+        regex: it would take two `path()` routes, which resolve slower than
+        the single regex.
+        """
+        if self.trailing_slash not in ("/", ""):
+            return None
+        lookup_placeholder, slash_placeholder = "\x00", "\x01"
+        try:
+            body = route_url.format(
+                prefix=prefix.rstrip("/"),
+                lookup=lookup_placeholder,
+                trailing_slash=slash_placeholder,
+            )
+        except (IndexError, KeyError):
+            return None
+        if not (body.startswith("^") and body.endswith("$")):
+            return None
+        body = body[1:-1]
+        if body.count(slash_placeholder) > 1 or (
+            slash_placeholder in body and not body.endswith(slash_placeholder)
+        ):
+            return None
+        body = body.replace(slash_placeholder, "")
+        if not is_literal_segment(body.replace(lookup_placeholder, "")):
+            return None
+        if lookup_placeholder in body:
+            if lookup_path is None:
+                return None
+            body = body.replace(lookup_placeholder, lookup_path)
+        return f"{body}{self.trailing_slash}"
+
     def get_method_map(self, viewset, method_map):
         """
         Given a viewset and a mapping {http_method: action},
@@ -238,11 +1257,25 @@ class HybridRouter(DefaultRouter):
         lookup_value = getattr(viewset, "lookup_value_regex", "[^/.]+")
         return f"(?P<{lookup_prefix}{lookup_url_kwarg}>{lookup_value})"
 
+    def get_lookup_path(self, viewset):
+        """
+        Return the `path()` converter segment for the lookup field, or None if
+        the lookup regex has no equivalent converter.
+        """
+        lookup_field = getattr(viewset, "lookup_field", "pk")
+        lookup_url_kwarg = getattr(viewset, "lookup_url_kwarg", None) or lookup_field
+        lookup_value = getattr(viewset, "lookup_value_regex", "[^/.]+")
+        converter = LOOKUP_CONVERTERS.get(lookup_value)
+        if converter is None or not lookup_url_kwarg.isidentifier():
+            return None
+        return f"<{converter}:{lookup_url_kwarg}>"
+
     def _get_api_root_view(self, node, prefix):
         api_root_dict = OrderedDict()
+        relative_paths = {}  # Listed when the URL names cannot be reversed yet
         has_children = False
 
-        for child_name, child_node in node.children.items():
+        for child_name, child_node in node.child_items():
             has_children = True
             if child_node.is_viewset or child_node.view:
                 url_name = f"{child_node.basename}-list"
@@ -251,29 +1284,49 @@ class HybridRouter(DefaultRouter):
             else:
                 url_name = f"{prefix}{child_name}-api-root"
             api_root_dict[child_name] = url_name
+            if child_node.is_viewset and self.trailing_slash == "":
+                relative_paths[child_name] = child_name
 
         if not has_children:
             return None
 
-        class APIRoot(APIView):
-            _ignore_model_permissions = True
-            schema = None  # Exclude from schema if necessary
+        return self._api_root_class.as_view(
+            reverse_cache=ReverseCache(api_root_dict, relative_paths),
+            cache_max_age=self.api_root_cache_max_age,
+        )
 
-            def get(self, request, *args, **kwargs):
-                ret = OrderedDict()
-                namespace = request.resolver_match.namespace
-                for key, url_name in api_root_dict.items():
-                    if namespace:
-                        url_name_full = f"{namespace}:{url_name}"
-                    else:
-                        url_name_full = url_name
-                    try:
-                        ret[key] = reverse(url_name_full, request=request)
-                    except NoReverseMatch:
-                        ret[key] = request.build_absolute_uri(f"{key}/")
-                return Response(ret)
+    def _get_api_root_class(self):
+        """
+        Return the class of the API root and intermediate views: the async
+        one with `async_views`, unless it cannot run without touching the
+        database.
+        """
+        if not self.async_views:
+            return APIRootView
+        if AsyncAPIRootView.can_run_async():
+            return AsyncAPIRootView
+        logger.warning(
+            "async_views is set but the API root views use permission classes "
+            "%s and throttle classes %s, which may need the database: "
+            "falling back to sync views.",
+            AsyncAPIRootView.permission_classes,
+            AsyncAPIRootView.throttle_classes,
+        )
+        return APIRootView
 
-        return APIRoot.as_view()
+    def get_allowed_methods(self):
+        """
+        Return the HTTP methods allowed by each route of the router's DRF
+        views, as listed in their `Allow` header, keyed by URL name (by route
+        for the intermediate views). Subtrees deferred by `lazy_subtrees` and
+        not built yet are left out.
+        """
+        allowed_methods = {}
+        for pattern in iter_url_patterns(self.urls):
+            allowed = get_allowed_methods(pattern.callback)
+            if allowed is not None:
+                allowed_methods[pattern.name or str(pattern.pattern)] = allowed
+        return allowed_methods
 
     def get_api_root_view(self, api_urls=None):
         """
@@ -286,7 +1339,63 @@ class HybridRouter(DefaultRouter):
 
     @property
     def urls(self):
-        urls = self.get_urls()
+        """
+        The compiled route table. It is built once and memoized until
+        `register()` or `register_nested_router()` is called again. Threads
+        reaching it at the same time share a single build.
+        """
+        urls = getattr(self, "_urls", None)
+        if urls is None:
+            with self._build_lock:
+                # Concurrent first accesses wait for a single build
+                urls = getattr(self, "_urls", None)
+                if urls is None:
+                    urls = self._build_url_table()
+        return urls
+
+    def _build_url_table(self):
+        """
+        Build the memoized route table, in the pending BuildReport if the
+        build is profiled.
+        """
+        report = self._get_build_report()
+        start = time.perf_counter()
+        urls = self._wrap_url_table(self.get_urls())
+        self._urls = urls
+        if report is not None:
+            self._finish_build_report(report, time.perf_counter() - start)
+        return urls
+
+    def _wrap_url_table(self, urls):
+        """
+        Add the API root and metrics views to the patterns of `get_urls()`,
+        and wrap them in the resolvers the settings ask for.
+        """
         if self.include_root_view:
-            urls.append(path("", self.get_api_root_view(), name=self.root_view_name))
+            with self._measure("intermediate_views", ""):
+                root_view = self.get_api_root_view()
+            root_urls = [path("", root_view, name=self.root_view_name)]
+            if self.short_circuit_methods:
+                short_circuit_patterns(root_urls)
+            if self.instrument_routes:
+                instrument_patterns(root_urls, self.route_metrics)
+            urls.extend(root_urls)
+        if self.instrument_routes and self.metrics_prefix:
+            urls.append(
+                path(
+                    f"{self.metrics_prefix.strip('/')}/",
+                    RouteMetricsView.as_view(route_metrics=self.route_metrics),
+                    name="hybridrouter-metrics",
+                )
+            )
+        if self.use_tree_resolver:
+            urls = [TreeURLResolver(self.root_node, urls)]
+        if self.resolve_cache_size:
+            # A new table starts with an empty cache
+            self.resolve_cache = ResolveCache(self.resolve_cache_size)
+            urls = [CachedResolver(urls, self.resolve_cache)]
+        else:
+            self.resolve_cache = None
+        if self.instrument_routes:
+            urls = [InstrumentedResolver(urls)]
         return urls
@@ -0,0 +1,250 @@
+import functools
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+
+from django.urls import URLPattern
+from django.urls.resolvers import RoutePattern, URLResolver
+
+from .resolvers import ViewSetRoutesResolver, _resolve_in_order
+
+try:
+    from asgiref.sync import iscoroutinefunction
+except ImportError:  # asgiref < 3.6
+    from asyncio import iscoroutinefunction
+
+# Upper bounds, in seconds, of the latency histogram buckets. A last bucket
+# counts the observations above the largest bound.
+LATENCY_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Time spent resolving the path that is about to be dispatched, set by the
+# InstrumentedResolver and consumed by the instrumented view.
+_resolve_time = ContextVar("hybridrouter_resolve_time", default=None)
+
+
+class Histogram:
+    """
+    Count of observations per fixed bucket, with their total and sum.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        """
+        Return the cumulative count of observations for each upper bound, the
+        last one being "+Inf", as in Prometheus histograms.
+        """
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + ("+Inf",), self.counts):
+            cumulative += count
+            buckets.append([bound, cumulative])
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class RouteStats:
+    __slots__ = ("hits", "resolve", "view")
+
+    def __init__(self, bounds):
+        self.hits = 0
+        self.resolve = Histogram(bounds)  # Time spent in the router's resolver
+        self.view = Histogram(bounds)  # Time spent in the view
+
+
+class RouteMetrics:
+    """
+    Hit counts and latency histograms of a router's routes, per route and
+    HTTP method. Routes are identified by their URL name, or by their route
+    when they have none (intermediate API views).
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self._stats = {}  # (route, method) -> RouteStats
+        self._lock = Lock()
+
+    def record(self, route, method, resolve_seconds, view_seconds):
+        with self._lock:
+            stats = self._stats.get((route, method))
+            if stats is None:
+                stats = self._stats[(route, method)] = RouteStats(self.bounds)
+            stats.hits += 1
+            if resolve_seconds is not None:
+                stats.resolve.observe(resolve_seconds)
+            stats.view.observe(view_seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def get_profile(self):
+        """
+        Return the number of hits of each route, all methods included, as
+        expected by `HybridRouter.route_profile`.
+        """
+        profile = {}
+        with self._lock:
+            for (route, _method), stats in self._stats.items():
+                profile[route] = profile.get(route, 0) + stats.hits
+        return profile
+
+    def as_dict(self):
+        """
+        Return the recorded metrics as JSON serializable data, the most hit
+        routes first.
+        """
+        with self._lock:
+            items = [
+                {
+                    "route": route,
+                    "method": method,
+                    "hits": stats.hits,
+                    "resolve_seconds": stats.resolve.as_dict(),
+                    "view_seconds": stats.view.as_dict(),
+                }
+                for (route, method), stats in self._stats.items()
+            ]
+        items.sort(key=lambda item: (-item["hits"], item["route"], item["method"]))
+        return {"routes": items}
+
+    def as_text(self):
+        """
+        Return the recorded metrics in the Prometheus text exposition format.
+        """
+        routes = self.as_dict()["routes"]
+        lines = ["# TYPE hybridrouter_route_hits_total counter"]
+        for item in routes:
+            lines.append(
+                f"hybridrouter_route_hits_total{{{_labels(item)}}} {item['hits']}"
+            )
+        for metric, key in (
+            ("hybridrouter_resolve_seconds", "resolve_seconds"),
+            ("hybridrouter_view_seconds", "view_seconds"),
+        ):
+            lines.append(f"# TYPE {metric} histogram")
+            for item in routes:
+                labels = _labels(item)
+                histogram = item[key]
+                for bound, count in histogram["buckets"]:
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{metric}_sum{{{labels}}} {histogram['sum']}")
+                lines.append(f"{metric}_count{{{labels}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(item):
+    return 'route="%s",method="%s"' % (
+        _escape_label(item["route"]),
+        _escape_label(item["method"]),
+    )
+
+
+def instrument_view(view, metrics, route):
+    """
+    Wrap `view` so that each call is recorded in `metrics` under `route`.
+    The wrapper keeps the attributes of the view (`cls`, `actions`,
+    `initkwargs`, `csrf_exempt`...) and is a coroutine function if the view
+    is one.
+    """
+    perf_counter = time.perf_counter
+
+    if iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def instrumented_view(request, *args, **kwargs):
+            resolve_seconds = _resolve_time.get()
+            _resolve_time.set(None)
+            start = perf_counter()
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                metrics.record(
+                    route, request.method, resolve_seconds, perf_counter() - start
+                )
+
+    else:
+
+        @functools.wraps(view)
+        def instrumented_view(request, *args, **kwargs):
+            resolve_seconds = _resolve_time.get()
+            _resolve_time.set(None)
+            start = perf_counter()
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                metrics.record(
+                    route, request.method, resolve_seconds, perf_counter() - start
+                )
+
+    instrumented_view.instrumented_route = route
+    return instrumented_view
+
+
+def instrument_patterns(patterns, metrics):
+    """
+    Replace the callback of the URL patterns emitted by the router with an
+    instrumented view, in place. Resolvers of nested routers are left alone.
+    """
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            route = pattern.name or str(pattern.pattern)
+            pattern.callback = instrument_view(pattern.callback, metrics, route)
+        elif isinstance(pattern, ViewSetRoutesResolver):
+            instrument_patterns(pattern.url_patterns, metrics)
+
+
+class InstrumentedResolver(URLResolver):
+    """
+    Resolve through the router's patterns and time it. The time is handed to
+    the instrumented view through a context variable, since the
+    `ResolverMatch` is rebuilt by every enclosing resolver.
+    """
+
+    def __init__(self, urlconf_name):
+        super().__init__(RoutePattern(""), urlconf_name)
+
+    def resolve(self, path):
+        start = time.perf_counter()
+        match = _resolve_in_order(self, self.url_patterns, str(path))
+        elapsed = time.perf_counter() - start
+        # Views that are not instrumented (the metrics view) must not leave a
+        # resolve time behind for the next instrumented view.
+        instrumented = hasattr(match.func, "instrumented_route")
+        _resolve_time.set(elapsed if instrumented else None)
+        return match
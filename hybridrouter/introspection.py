@@ -0,0 +1,64 @@
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+
+class ViewSetIntrospection:
+    """
+    What a router needs to know about a ViewSet to generate its patterns:
+    its routes, the method map of each route and its lookup regex and
+    converter segment.
+    """
+
+    __slots__ = ("routes", "mappings", "lookup", "lookup_path")
+
+    def __init__(self, routes, mappings, lookup, lookup_path):
+        self.routes = routes
+        self.mappings = mappings  # Method map of each route, in the same order
+        self.lookup = lookup
+        self.lookup_path = lookup_path
+
+
+def introspect_viewset(router, viewset):
+    routes = router.get_routes(viewset)
+    return ViewSetIntrospection(
+        routes=tuple(routes),
+        mappings=tuple(
+            router.get_method_map(viewset, route.mapping) for route in routes
+        ),
+        lookup=router.get_lookup_regex(viewset),
+        lookup_path=router.get_lookup_path(viewset),
+    )
+
+
+# ViewSet class -> {router configuration: ViewSetIntrospection}. Entries go
+# away with their class, so a class redefined by a reload is introspected
+# again instead of reusing the data of the previous definition.
+_introspection_cache = WeakKeyDictionary()
+_introspection_lock = Lock()
+
+
+def get_viewset_introspection(router, viewset):
+    """
+    Return the introspection of `viewset` for `router`, shared by every router
+    of the same class and routes in the process.
+    """
+    if not isinstance(viewset, type):
+        return introspect_viewset(router, viewset)
+    key = (type(router), repr(router.routes))
+    with _introspection_lock:
+        entries = _introspection_cache.get(viewset)
+        introspection = entries.get(key) if entries is not None else None
+    if introspection is None:
+        introspection = introspect_viewset(router, viewset)
+        with _introspection_lock:
+            _introspection_cache.setdefault(viewset, {})[key] = introspection
+    return introspection
+
+
+def clear_viewset_introspection_cache():
+    """
+    Forget every cached introspection, for instance after changing the
+    actions or lookup of a ViewSet class in place.
+    """
+    with _introspection_lock:
+        _introspection_cache.clear()
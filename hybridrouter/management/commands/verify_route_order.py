@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from hybridrouter.ordering import verify_route_order
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that ordering a HybridRouter's routes by a route profile does "
+        "not change the view any path resolves to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "router", help="Dotted path of the router, e.g. myproject.urls.router"
+        )
+        parser.add_argument(
+            "--profile",
+            help="JSON route profile, defaults to the router's route_profile",
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            default=[],
+            dest="paths",
+            help="Extra path to check, can be repeated",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            router = import_string(options["router"])
+        except ImportError as e:
+            raise CommandError(f"Cannot import the router: {e}") from e
+        profile = options["profile"] or router.route_profile
+        if profile is None:
+            raise CommandError("No route profile given and the router has none.")
+
+        checked, mismatches = verify_route_order(router, profile, options["paths"])
+        for path, expected, actual in mismatches:
+            self.stderr.write(f"/{path}: {expected!r} != {actual!r}")
+        if mismatches:
+            raise CommandError(
+                f"{len(mismatches)} of {checked} paths resolve differently."
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"{checked} paths resolve to the same routes.")
+        )
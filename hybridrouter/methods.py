@@ -0,0 +1,125 @@
+import functools
+
+from django.http import HttpResponse
+from django.urls import URLPattern
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.renderers import JSONRenderer
+
+from .resolvers import DispatchedView, ViewSetRoutesResolver
+
+try:
+    from asgiref.sync import iscoroutinefunction
+except ImportError:  # asgiref < 3.6
+    from asyncio import iscoroutinefunction
+
+
+def get_allowed_methods(view):
+    """
+    Return the HTTP methods the DRF view function `view` answers, in the
+    order of DRF's `Allow` header, or None if it is not a DRF view. Lazy
+    stand-ins, whose class is not imported yet, give None as well.
+    """
+    if isinstance(view, DispatchedView):
+        view = view.get_view()
+    try:
+        # Read from the function itself, looking the class up on a lazy
+        # stand-in would import it
+        attributes = vars(view)
+    except TypeError:
+        return None
+    cls = attributes.get("cls")
+    if cls is None:
+        return None
+    actions = attributes.get("actions") or {}
+    initkwargs = attributes.get("initkwargs") or {}
+    http_method_names = initkwargs.get("http_method_names", cls.http_method_names)
+    # The handlers DRF binds on the instance: a ViewSet's actions, and HEAD
+    # answered by GET
+    handlers = set(actions)
+    if "get" in handlers or hasattr(cls, "get"):
+        handlers.add("head")
+    return tuple(
+        method.upper()
+        for method in http_method_names
+        if method in handlers or hasattr(cls, method)
+    )
+
+
+def method_not_allowed(request, allowed):
+    """
+    Return the 405 response DRF gives for `request`, rendered as JSON.
+    """
+    detail = MethodNotAllowed(request.method).detail
+    response = HttpResponse(
+        JSONRenderer().render({"detail": detail}),
+        content_type="application/json",
+        status=405,
+    )
+    response["Allow"] = ", ".join(allowed)
+    return response
+
+
+def preflight(request, allowed):
+    """
+    Answer a CORS preflight request with the allowed methods.
+    """
+    response = HttpResponse()
+    response["Allow"] = ", ".join(allowed)
+    return response
+
+
+def short_circuit(request, allowed):
+    """
+    Return the response to `request` if it can be given without calling the
+    view, otherwise None.
+    """
+    method = request.method
+    if method not in allowed:
+        return method_not_allowed(request, allowed)
+    if method == "OPTIONS" and "HTTP_ACCESS_CONTROL_REQUEST_METHOD" in request.META:
+        return preflight(request, allowed)
+    return None
+
+
+def short_circuit_view(view, allowed):
+    """
+    Wrap `view` so that requests with a method outside of `allowed` and CORS
+    preflight requests are answered before the view class is instantiated.
+    The wrapper keeps the attributes of the view and is a coroutine function
+    if the view is one.
+    """
+    if iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def short_circuit_view(request, *args, **kwargs):
+            response = short_circuit(request, allowed)
+            if response is not None:
+                return response
+            return await view(request, *args, **kwargs)
+
+    else:
+
+        @functools.wraps(view)
+        def short_circuit_view(request, *args, **kwargs):
+            response = short_circuit(request, allowed)
+            if response is not None:
+                return response
+            return view(request, *args, **kwargs)
+
+    short_circuit_view.allowed_methods = allowed
+    return short_circuit_view
+
+
+def short_circuit_patterns(patterns):
+    """
+    Replace the callback of the DRF views in `patterns` with a view
+    answering disallowed methods and CORS preflights by itself, in place.
+    Other views and resolvers of nested routers are left alone.
+    """
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            allowed = get_allowed_methods(pattern.callback)
+            if allowed is not None:
+                pattern.callback = short_circuit_view(pattern.callback, allowed)
+        elif isinstance(pattern, ViewSetRoutesResolver):
+            short_circuit_patterns(pattern.url_patterns)
@@ -0,0 +1,153 @@
+import json
+import os
+from itertools import product
+
+from django.urls.exceptions import Resolver404
+from django.urls.resolvers import RoutePattern, URLResolver
+
+from .resolvers import is_anchored, is_literal_segment
+from .snapshot import iter_url_patterns
+from .utils import logger
+
+# Values tried for every URL parameter when generating sample paths
+SAMPLE_VALUES = (
+    "1",
+    "42",
+    "abc",
+    "some-name",
+    "1.json",
+    "0f8fad5b-d9cb-469f-a165-70867728950e",
+)
+
+
+def load_route_profile(profile):
+    """
+    Return a mapping of route -> hit count from `profile`, which can be such a
+    mapping, a `RouteMetrics`, or the path of a JSON file holding either a
+    mapping or the output of `RouteMetrics.as_dict()`. Returns None, after
+    logging a warning, if the file cannot be used.
+    """
+    if profile is None:
+        return None
+    if hasattr(profile, "get_profile"):
+        return profile.get_profile()
+    if isinstance(profile, (str, os.PathLike)):
+        try:
+            with open(profile, encoding="utf-8") as profile_file:
+                profile = json.load(profile_file)
+        except (OSError, ValueError) as e:
+            logger.warning("The route profile %s cannot be used: %s", profile, e)
+            return None
+    if isinstance(profile, dict) and isinstance(profile.get("routes"), list):
+        weights = {}
+        for item in profile["routes"]:
+            weights[item["route"]] = weights.get(item["route"], 0) + item["hits"]
+        return weights
+    return dict(profile)
+
+
+def _get_block_weight(patterns, weights):
+    routes = {
+        pattern.name or str(pattern.pattern) for pattern in iter_url_patterns(patterns)
+    }
+    return sum(weights.get(route, 0) for route in routes)
+
+
+def order_sibling_blocks(blocks, weights):
+    """
+    Sort the patterns of sibling subtrees, given as `(child, child_prefix,
+    patterns)` blocks, from the most to the least hit.
+
+    Only the blocks of children with a literal name whose patterns all start
+    with that name are moved: they cannot match the same paths, so their
+    relative order does not matter. Any other child (regex or converter
+    segment, pattern that could match outside of its prefix) stays where it
+    is and no block is moved across it.
+    """
+    ordered = []
+    run = []
+
+    def flush():
+        run.sort(key=lambda item: -item[0])  # Stable: ties keep their order
+        ordered.extend(patterns for _weight, patterns in run)
+        run.clear()
+
+    for child, child_prefix, patterns in blocks:
+        if is_literal_segment(child.name) and all(
+            is_anchored(pattern, child_prefix) for pattern in patterns
+        ):
+            run.append((_get_block_weight(patterns, weights), patterns))
+        else:
+            flush()
+            ordered.append(patterns)
+    flush()
+    return ordered
+
+
+def iter_sample_paths(patterns):
+    """
+    Yield sample paths for `patterns`: every reversible route filled with
+    `SAMPLE_VALUES`, with and without its trailing slash.
+    """
+    resolver = URLResolver(RoutePattern(""), patterns)
+    seen = set()
+    for possibilities_list in resolver.reverse_dict.lists():
+        for possibilities, _pattern, _defaults, _converters in possibilities_list[1]:
+            for result, params in possibilities:
+                for values in product(SAMPLE_VALUES, repeat=len(params)):
+                    sample = result % dict(zip(params, values))
+                    alternate = sample[:-1] if sample.endswith("/") else f"{sample}/"
+                    for candidate in (sample, alternate):
+                        if candidate not in seen:
+                            seen.add(candidate)
+                            yield candidate
+
+
+def _describe(resolver, path):
+    try:
+        match = resolver.resolve(path)
+    except Resolver404:
+        return None
+    return (
+        getattr(match.func, "cls", match.func),
+        getattr(match.func, "actions", None),
+        match.args,
+        match.kwargs,
+        match.url_name,
+        match.route,
+    )
+
+
+def verify_route_order(router, profile=None, paths=()):
+    """
+    Build the routes of `router` without and with a route profile (its
+    `route_profile` by default) and resolve sample paths against both.
+
+    Returns the number of paths checked and a list of `(path, expected,
+    actual)` for the paths that do not resolve to the same route.
+    """
+    if profile is None:
+        profile = router.route_profile
+    original_profile = router.route_profile
+    try:
+        router.route_profile = None
+        router._invalidate_urls()
+        baseline = list(router.urls)
+        router.route_profile = profile
+        router._invalidate_urls()
+        ordered = list(router.urls)
+    finally:
+        router.route_profile = original_profile
+        router._invalidate_urls()
+
+    baseline_resolver = URLResolver(RoutePattern(""), baseline)
+    ordered_resolver = URLResolver(RoutePattern(""), ordered)
+    sample_paths = list(iter_sample_paths(baseline))
+    sample_paths.extend(path.lstrip("/") for path in paths)
+    mismatches = []
+    for path in sample_paths:
+        expected = _describe(baseline_resolver, path)
+        actual = _describe(ordered_resolver, path)
+        if expected != actual:
+            mismatches.append((path, expected, actual))
+    return len(sample_paths), mismatches
@@ -0,0 +1,100 @@
+import time
+from contextlib import contextmanager
+
+# Phases timed by a BuildReport, in the order they happen
+BUILD_PHASES = (
+    "tree",  # Inserting registrations in the TreeNode tree
+    "conflicts",  # Resolving basename conflicts
+    "introspection",  # get_routes(), get_method_map() and the lookup regex
+    "as_view",  # Wrapping views and ViewSet actions with as_view()
+    "snapshot",  # Rebuilding ViewSet routes from a route snapshot
+    "intermediate_views",  # Creating the API root and intermediate views
+)
+
+
+class BuildReport:
+    """
+    Time spent in each phase of a router build, in total and per
+    registration. Registration phases (`tree`, `conflicts`) are those of the
+    `register()` calls made since the previous build.
+    """
+
+    def __init__(self):
+        self.total = 0.0  # Seconds spent in `router.urls`
+        self._phases = {}  # phase -> [seconds, count]
+        self._items = {}  # registration -> {phase: seconds}
+
+    @contextmanager
+    def measure(self, phase, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, label, time.perf_counter() - start)
+
+    def record(self, phase, label, seconds):
+        totals = self._phases.get(phase)
+        if totals is None:
+            totals = self._phases[phase] = [0.0, 0]
+        totals[0] += seconds
+        totals[1] += 1
+        item = self._items.setdefault(label, {})
+        item[phase] = item.get(phase, 0.0) + seconds
+
+    def get_phases(self):
+        """
+        Return `{"phase", "seconds", "count"}` dicts, slowest phase first.
+        """
+        phases = [
+            {"phase": phase, "seconds": seconds, "count": count}
+            for phase, (seconds, count) in self._phases.items()
+        ]
+        phases.sort(key=lambda item: -item["seconds"])
+        return phases
+
+    def get_registrations(self):
+        """
+        Return `{"registration", "seconds", "phases"}` dicts, slowest
+        registration first. Registrations are identified by their prefix.
+        """
+        items = [
+            {
+                "registration": label,
+                "seconds": sum(phases.values()),
+                "phases": dict(phases),
+            }
+            for label, phases in self._items.items()
+        ]
+        items.sort(key=lambda item: -item["seconds"])
+        return items
+
+    def as_dict(self):
+        return {
+            "total": self.total,
+            "phases": self.get_phases(),
+            "registrations": self.get_registrations(),
+        }
+
+    def format(self, limit=10):
+        """
+        Return a human readable summary with the `limit` slowest registrations.
+        """
+        lines = [f"Router built in {self.total * 1e3:.2f} ms"]
+        for item in self.get_phases():
+            lines.append(
+                f"  {item['phase']}: {item['seconds'] * 1e3:.2f} ms"
+                f" ({item['count']} calls)"
+            )
+        registrations = self.get_registrations()
+        if registrations:
+            lines.append(f"Slowest registrations ({len(registrations)} in total):")
+        for item in registrations[:limit]:
+            phases = ", ".join(
+                f"{phase} {seconds * 1e3:.2f} ms"
+                for phase, seconds in item["phases"].items()
+            )
+            lines.append(
+                f"  {item['registration'] or '/'}: {item['seconds'] * 1e3:.2f} ms"
+                f" ({phases})"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,631 @@
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+import django
+from django.urls import re_path
+from django.urls.exceptions import Resolver404
+from django.urls.resolvers import (
+    RegexPattern,
+    ResolverMatch,
+    RoutePattern,
+    URLPattern,
+    URLResolver,
+)
+from django.utils.functional import cached_property
+
+# Characters that make a path segment something other than a plain literal,
+# either for `re_path` (regex metacharacters) or for `path` (converters).
+_NON_LITERAL_SEGMENT = re.compile(r"[.^$*+?{}\[\]\\|()<>]")
+
+
+# Set while URLs are reversed without building the lazy subtrees, see
+# `defer_lazy_subtrees()`
+_deferring_subtrees = ContextVar("hybridrouter_deferring_subtrees", default=False)
+
+
+class SubtreeNotBuilt(Exception):
+    """
+    Raised by a lazy subtree that is not built yet when a reverse table is
+    filled inside `defer_lazy_subtrees()`.
+    """
+
+
+@contextmanager
+def defer_lazy_subtrees():
+    """
+    Reverse URLs in the block without building any lazy subtree: filling a
+    reverse table that needs one raises SubtreeNotBuilt instead. Django only
+    stores a reverse table once it is complete, so the other reverse() calls
+    are not affected.
+    """
+    token = _deferring_subtrees.set(True)
+    try:
+        yield
+    finally:
+        _deferring_subtrees.reset(token)
+
+
+def is_literal_segment(segment):
+    return not _NON_LITERAL_SEGMENT.search(segment)
+
+
+def is_anchored(pattern, prefix):
+    """
+    Return True if `pattern` can only match paths that start with the literal
+    `prefix` (followed by a slash or the end of the path).
+    """
+    if not prefix:
+        return True
+    if isinstance(pattern, (LazySubtreeResolver, ViewSetDispatchResolver)):
+        # Only matches under its own prefix, and is not built to find out
+        return f"{pattern.prefix}/".startswith(prefix)
+    route = str(pattern.pattern)
+    if isinstance(pattern.pattern, PrefixedRegexPattern):
+        route = pattern.pattern.prefixed_regex
+    if isinstance(pattern, URLResolver) and not route:
+        # A resolver grouping patterns without a prefix of its own
+        return all(
+            is_anchored(sub_pattern, prefix) for sub_pattern in pattern.url_patterns
+        )
+    if isinstance(pattern.pattern, RoutePattern):
+        return route.startswith(prefix)
+    stem = "^" + prefix.rstrip("/")
+    return route.startswith(stem) and route[len(stem) : len(stem) + 1] in ("/", "$")
+
+
+class PrefixedRegexPattern(RegexPattern):
+    """
+    Regex of a pattern inlined under a literal prefix. It matches with the
+    prefixed regex, while its route, as given to `ResolverMatch.route`, is
+    the one `include()` under the prefix would give: the prefix, then the
+    regex without its "^" anchor.
+    """
+
+    def __init__(self, regex, route, name=None, is_endpoint=False):
+        super().__init__(regex, name=name, is_endpoint=is_endpoint)
+        self.prefixed_regex = regex
+        self.route = route
+
+    def __str__(self):
+        return self.route
+
+
+def _prefix_pattern(pattern, prefix):
+    """
+    Return the pattern object of `pattern` with the literal `prefix` prepended,
+    or None if it cannot be composed.
+    """
+    route = str(pattern.pattern)
+    pattern_class = type(pattern.pattern)
+    name = pattern.pattern.name
+    is_endpoint = isinstance(pattern, URLPattern)
+    if pattern_class is RoutePattern:
+        return RoutePattern(prefix + route, name=name, is_endpoint=is_endpoint)
+    if pattern_class is PrefixedRegexPattern:
+        regex = pattern.pattern.prefixed_regex
+    elif pattern_class is RegexPattern and route.startswith("^"):
+        regex = route
+    else:
+        return None
+    # A literal prefix has no regex metacharacter, it needs no escaping
+    return PrefixedRegexPattern(
+        "^" + prefix + regex[1:],
+        prefix + route.removeprefix("^"),
+        name=name,
+        is_endpoint=is_endpoint,
+    )
+
+
+def prefix_patterns(patterns, prefix):
+    """
+    Return `patterns` with the literal `prefix` prepended to each of them, as
+    `include()` under `prefix` would match them without the extra resolver,
+    or None if one of them cannot be composed (regex not anchored with "^",
+    resolver of an unknown class).
+    """
+    if not is_literal_segment(prefix):
+        return None
+    prefixed = []
+    for pattern in patterns:
+        if type(pattern) not in (URLPattern, URLResolver):
+            return None
+        new_pattern = _prefix_pattern(pattern, prefix)
+        if new_pattern is None:
+            return None
+        if isinstance(pattern, URLPattern):
+            prefixed.append(
+                URLPattern(
+                    new_pattern, pattern.callback, pattern.default_args, pattern.name
+                )
+            )
+        else:
+            prefixed.append(
+                URLResolver(
+                    new_pattern,
+                    pattern.urlconf_name,
+                    pattern.default_kwargs,
+                    pattern.app_name,
+                    pattern.namespace,
+                )
+            )
+    return prefixed
+
+
+def make_resolver_match(callback, args, kwargs, url_name, route):
+    """
+    Return the ResolverMatch a URLPattern without default kwargs gives for
+    the `args` and `kwargs` captured by its `route`. The captured and extra
+    kwargs are only recorded since Django 4.1.
+    """
+    if django.VERSION >= (4, 1):
+        return ResolverMatch(
+            callback,
+            args,
+            dict(kwargs),
+            url_name,
+            route=route,
+            captured_kwargs=kwargs,
+            extra_kwargs={},
+        )
+    return ResolverMatch(callback, args, kwargs, url_name, route=route)
+
+
+def copy_resolver_match(match):
+    """
+    Return a copy of `match` that resolvers can update. ResolverMatch cannot
+    be copied with `copy.copy()` since it refuses to be pickled.
+    """
+    clone = ResolverMatch.__new__(ResolverMatch)
+    clone.__dict__.update(match.__dict__)
+    return clone
+
+
+def _resolve_in_order(resolver, patterns, path):
+    """
+    Resolve `path` against `patterns` the way `URLResolver.resolve()` does for
+    a resolver with an empty pattern, no default kwargs and no namespace.
+    """
+    tried = []
+    for pattern in patterns:
+        try:
+            sub_match = pattern.resolve(path)
+        except Resolver404 as e:
+            resolver._extend_tried(tried, pattern, e.args[0].get("tried"))
+        else:
+            if sub_match:
+                if not isinstance(pattern, URLPattern):
+                    sub_match.route = resolver._join_route(
+                        str(pattern.pattern), sub_match.route
+                    )
+                resolver._extend_tried(tried, pattern, sub_match.tried)
+                sub_match.tried = tried
+                return sub_match
+            tried.append([pattern])
+    raise Resolver404({"tried": tried, "path": path})
+
+
+class _NodeTable:
+    __slots__ = ("candidates", "static")
+
+    def __init__(self):
+        self.candidates = []  # (position, pattern) tried whenever the node is reached
+        self.static = {}  # literal segment -> child TreeNode
+
+
+class TreeURLResolver(URLResolver):
+    """
+    A resolver that dispatches through the router's `TreeNode` tree instead of
+    testing every generated pattern in turn.
+
+    The path is walked segment by segment through the literal children of the
+    tree, and only the patterns owned by the nodes on that branch are matched.
+    Candidates are always tried in their original order, so the resulting
+    `ResolverMatch` is the same as with the flat list of patterns, which is
+    still exposed through `url_patterns` for reversing.
+    """
+
+    def __init__(self, root_node, urlconf_name):
+        super().__init__(RoutePattern(""), urlconf_name)
+        self.root_node = root_node
+        self._tables = {}
+        self._positions = {id(p): i for i, p in enumerate(urlconf_name)}
+        self._owned = set()
+        self._global = []
+        self._index_node(root_node, "")
+        # Patterns that are not owned by a node (such as the API root view),
+        # or that could match outside of their node, are always tried.
+        self._global.extend(
+            (i, p) for i, p in enumerate(urlconf_name) if id(p) not in self._owned
+        )
+        self._global.sort(key=lambda item: item[0])
+        del self._positions, self._owned
+
+    def _own(self, node, prefix, table):
+        for pattern in node.patterns:
+            position = self._positions.get(id(pattern))
+            if position is None:
+                continue
+            self._owned.add(id(pattern))
+            if is_anchored(pattern, prefix):
+                table.candidates.append((position, pattern))
+            else:
+                self._global.append((position, pattern))
+
+    def _own_subtree(self, node, prefix, table):
+        self._own(node, prefix, table)
+        for child in node.child_nodes():
+            self._own_subtree(child, f"{prefix}{child.name}/", table)
+
+    def _index_node(self, node, prefix):
+        table = self._tables[id(node)] = _NodeTable()
+        self._own(node, prefix, table)
+        for child in node.child_nodes():
+            child_prefix = f"{prefix}{child.name}/"
+            if is_literal_segment(child.name):
+                table.static[child.name] = child
+                self._index_node(child, child_prefix)
+            else:
+                # Patterns below a regex or converter segment cannot be
+                # reached by literal lookup: try them whenever the parent is.
+                self._own_subtree(child, child_prefix, table)
+
+    def resolve(self, path):
+        path = str(path)  # path may be a reverse_lazy object
+        candidates = list(self._global)
+        table = self._tables[id(self.root_node)]
+        for segment in path.split("/"):
+            candidates.extend(table.candidates)
+            node = table.static.get(segment)
+            if node is None:
+                break
+            table = self._tables[id(node)]
+        else:
+            candidates.extend(table.candidates)
+        candidates.sort(key=lambda item: item[0])
+        return _resolve_in_order(self, [pattern for _, pattern in candidates], path)
+
+
+_GROUP_NAME = re.compile(r"\(\?P([<=])(\w+)")
+# Global inline flags and numbered backreferences cannot be combined
+_UNMERGEABLE = re.compile(r"\(\?[aiLmsux]+\)|\\[1-9]")
+
+
+class ViewSetRoutesResolver(URLResolver):
+    """
+    Groups the patterns generated for one ViewSet behind a single regex.
+
+    Each route's regex becomes a named alternative of the combined regex, so a
+    single `match()` finds the first route that can match the path, which is
+    then resolved directly instead of trying every route in turn. The route
+    patterns are still exposed through `url_patterns` for reversing.
+    """
+
+    def __init__(self, patterns, combined_pattern):
+        super().__init__(RoutePattern(""), patterns)
+        self.combined_pattern = combined_pattern
+
+    @classmethod
+    def merge(cls, patterns):
+        """
+        Return a resolver for `patterns`, or None if their regexes cannot be
+        combined (unanchored or using inline flags).
+        """
+        alternatives = []
+        for idx, pattern in enumerate(patterns):
+            if not isinstance(pattern, URLPattern):
+                return None
+            regex = pattern.pattern.regex.pattern
+            if not regex.startswith("^") or _UNMERGEABLE.search(regex):
+                return None
+            # Group names must be unique across the alternatives
+            regex = _GROUP_NAME.sub(
+                lambda m, idx=idx: f"(?P{m.group(1)}_r{idx}_{m.group(2)}", regex[1:]
+            )
+            alternatives.append(f"(?P<_r{idx}>{regex})")
+        return cls(patterns, "^(?:%s)" % "|".join(alternatives))
+
+    @cached_property
+    def combined_regex(self):
+        # Compiled on first use so that building the URLs stays cheap
+        try:
+            return re.compile(self.combined_pattern)
+        except re.error:
+            return None
+
+    def resolve(self, path):
+        path = str(path)  # path may be a reverse_lazy object
+        patterns = self.url_patterns
+        if self.combined_regex is None:
+            return _resolve_in_order(self, patterns, path)
+        match = self.combined_regex.match(path)
+        if match is None:
+            # Like a URLPattern that does not match: the parent resolver
+            # records this resolver as tried and moves on.
+            return None
+        # The combined regex is at least as permissive as each route, so no
+        # route before the selected one can match the path.
+        start = int(match.lastgroup[2:])
+        return _resolve_in_order(self, patterns[start:], path)
+
+
+class LazySubtreeResolver(URLResolver):
+    """
+    Stands for the patterns of a router subtree, which are only built by
+    `build()` when a path under `prefix` is first resolved, or when a URL is
+    first reversed outside of `defer_lazy_subtrees()`. The patterns keep
+    their full route: the resolver has an empty pattern of its own and
+    checks the prefix before trying them.
+    """
+
+    builds = 0  # Lazy subtrees built so far, by any router
+
+    def __init__(self, prefix, build):
+        super().__init__(RoutePattern(""), [])
+        self.prefix = prefix.rstrip("/")
+        self._build = build
+        self._patterns = None
+        self._lock = Lock()
+
+    @property
+    def is_built(self):
+        return self._patterns is not None
+
+    @cached_property
+    def url_patterns(self):
+        if self._patterns is None:
+            with self._lock:
+                if self._patterns is None:
+                    self._patterns = self._build()
+                    LazySubtreeResolver.builds += 1
+        return self._patterns
+
+    def _populate(self):
+        # The reverse table is made of the patterns
+        if self._patterns is None and _deferring_subtrees.get():
+            raise SubtreeNotBuilt(self.prefix)
+        super()._populate()
+
+    def resolve(self, path):
+        path = str(path)  # path may be a reverse_lazy object
+        prefix = self.prefix
+        if not path.startswith(prefix) or path[len(prefix) : len(prefix) + 1] not in (
+            "",
+            "/",
+        ):
+            # Like ViewSetRoutesResolver, a miss is not an exception
+            return None
+        return _resolve_in_order(self, self.url_patterns, path)
+
+
+class DispatchRoute:
+    """
+    A route of a ViewSetDispatchResolver: its regex and URL name, as the
+    `re_path` it replaces, and the literal `suffix` it matches after the
+    prefix, or after the lookup for a `detail` route. Routes whose suffix is
+    not literal have a None `suffix` and are matched with their regex.
+    """
+
+    __slots__ = ("regex", "name", "suffix", "detail")
+
+    def __init__(self, regex, name, suffix, detail):
+        self.regex = regex
+        self.name = name
+        self.suffix = suffix
+        self.detail = detail
+
+
+class DispatchedView:
+    """
+    Callback of a route pattern of a ViewSetDispatchResolver, used to reverse
+    URLs. The view of the route is only created when it is called or one of
+    its attributes is looked up.
+    """
+
+    def __init__(self, resolver, idx):
+        self.resolver = resolver
+        self.idx = idx
+
+    def get_view(self):
+        return self.resolver.get_view(self.idx)
+
+    def __call__(self, request, *args, **kwargs):
+        return self.get_view()(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        # Looked up by Django when it builds the reverse table
+        if name.startswith("__") or name == "view_class":
+            raise AttributeError(name)
+        return getattr(self.get_view(), name)
+
+    def __repr__(self):
+        return f"<DispatchedView {self.resolver.routes[self.idx].name}>"
+
+
+class ViewSetDispatchResolver(URLResolver):
+    """
+    Matches every route of one ViewSet under its literal `prefix`, with no
+    pattern per route.
+
+    The path after the prefix is looked up in a table of the routes' literal
+    suffixes, keyed by suffix and by the presence of a lookup, which is
+    matched with the lookup regex alone. The first route of the ViewSet
+    matching the path wins, as with the flat patterns. The view of each
+    route is only created, by `make_view(index)`, when it is first resolved.
+    The route patterns, needed to reverse URLs, are created when they are
+    first used, with DispatchedView callbacks so that reversing creates no
+    view.
+    """
+
+    def __init__(self, prefix, routes, lookup, trailing_slash, make_view):
+        super().__init__(RoutePattern(""), [])
+        self.prefix = prefix.rstrip("/")
+        self.routes = routes
+        self.trailing_slash = trailing_slash
+        self._make_view = make_view
+        self._views = [None] * len(routes)
+        self._lock = Lock()
+        self._lookup = re.compile(lookup)
+        self._table = {}  # (suffix, detail) -> index of the first route
+        self._regex_routes = []  # (index, RegexPattern)
+        for idx, route in enumerate(routes):
+            if route.suffix is None:
+                pattern = RegexPattern(route.regex, name=route.name, is_endpoint=True)
+                self._regex_routes.append((idx, pattern))
+            else:
+                self._table.setdefault((route.suffix, route.detail), idx)
+
+    def get_view(self, idx):
+        view = self._views[idx]
+        if view is None:
+            with self._lock:
+                view = self._views[idx]
+                if view is None:
+                    view = self._views[idx] = self._make_view(idx)
+        return view
+
+    @cached_property
+    def url_patterns(self):
+        return [
+            re_path(route.regex, DispatchedView(self, idx), name=route.name)
+            for idx, route in enumerate(self.routes)
+        ]
+
+    def _strip_trailing_slash(self, rest):
+        if self.trailing_slash == "/":
+            return rest[:-1] if rest.endswith("/") else None
+        if self.trailing_slash == "/?" and rest.endswith("/"):
+            return rest[:-1]
+        return rest
+
+    def _lookup_in_table(self, rest):
+        """
+        Return the index of the first route with a literal suffix matching
+        `rest`, the path after the prefix, and the captured kwargs.
+        """
+        body = self._strip_trailing_slash(rest)
+        if body is None:
+            return None, None
+        if not body:
+            return self._table.get(("", False)), {}
+        if body[0] != "/":
+            return None, None
+        body = body[1:]
+        if not body:
+            return None, None
+        list_idx = self._table.get((body, False))
+        lookup_value, sep, suffix = body.partition("/")
+        detail_idx = None
+        if not sep or suffix:
+            detail_idx = self._table.get((suffix, True))
+        if detail_idx is not None and (list_idx is None or detail_idx < list_idx):
+            match = self._lookup.fullmatch(lookup_value)
+            if match is not None:
+                return detail_idx, match.groupdict()
+        return list_idx, {}
+
+    def resolve(self, path):
+        path = str(path)  # path may be a reverse_lazy object
+        prefix = self.prefix
+        if not path.startswith(prefix):
+            return None
+        rest = path[len(prefix) :]
+        if rest and rest[0] != "/":
+            return None
+        idx, kwargs = self._lookup_in_table(rest)
+        args = ()
+        # Routes matched with their regex win if they come first
+        for regex_idx, pattern in self._regex_routes:
+            if idx is not None and regex_idx > idx:
+                break
+            match = pattern.match(path)
+            if match is not None:
+                idx, args, kwargs = regex_idx, match[1], match[2]
+                break
+        if idx is None:
+            # Like ViewSetRoutesResolver, a miss is not an exception
+            return None
+        route = self.routes[idx]
+        return make_resolver_match(
+            self.get_view(idx), args, kwargs, route.name, route.regex
+        )
+
+
+class ResolveCache:
+    """
+    Bounded LRU mapping of paths to the ResolverMatch they resolve to, with
+    hit and miss counters.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0  # Lookups of paths not in the cache, cacheable or not
+        self._matches = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._matches)
+
+    def get(self, path):
+        with self._lock:
+            match = self._matches.get(path)
+            if match is None:
+                self.misses += 1
+                return None
+            self._matches.move_to_end(path)
+            self.hits += 1
+            return match
+
+    def set(self, path, match):
+        with self._lock:
+            self._matches[path] = match
+            self._matches.move_to_end(path)
+            if len(self._matches) > self.maxsize:
+                self._matches.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._matches.clear()
+            self.hits = self.misses = 0
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "size": len(self._matches),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class CachedResolver(URLResolver):
+    """
+    Resolve through the router's patterns, remembering the matches of the
+    paths that capture nothing (root and intermediate views, list routes...)
+    in a ResolveCache. Paths capturing a lookup or other values, and paths
+    that do not resolve, are never cached, so that they cannot evict the
+    frequent ones. The `tried` list of a cached match only holds the
+    matched patterns.
+    """
+
+    def __init__(self, urlconf_name, cache):
+        super().__init__(RoutePattern(""), urlconf_name)
+        self.cache = cache
+
+    def resolve(self, path):
+        path = str(path)  # path may be a reverse_lazy object
+        match = self.cache.get(path)
+        if match is None:
+            match = _resolve_in_order(self, self.url_patterns, path)
+            if not match.args and not match.kwargs:
+                cached = copy_resolver_match(match)
+                # Only keep the matched patterns: enclosing resolvers copy
+                # the list, which is as long as the route table otherwise
+                cached.tried = match.tried[-1:]
+                self.cache.set(path, cached)
+            return match
+        # Enclosing resolvers may update the match they get
+        return copy_resolver_match(match)
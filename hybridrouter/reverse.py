@@ -0,0 +1,147 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from django.urls import get_resolver, get_script_prefix, get_urlconf
+from django.urls import reverse as django_reverse
+from django.urls.exceptions import NoReverseMatch
+from django.utils.http import parse_etags
+from django.utils.translation import get_language
+from rest_framework.reverse import preserve_builtin_query_params, reverse
+
+from .resolvers import LazySubtreeResolver, SubtreeNotBuilt, defer_lazy_subtrees
+
+
+class ReverseCache:
+    """
+    Memoize the relative URLs listed by an API root view.
+
+    The paths are reversed once per URLconf, script prefix, language and
+    namespace, so a request only has to prepend its scheme and host. Requests
+    using a DRF versioning scheme go through DRF's `reverse()` every time,
+    since the scheme may rewrite the view name per request.
+
+    Reversing never builds the lazy subtrees of a router: while the URLconf
+    cannot be reversed without building one, the listing is made of paths
+    relative to the request, until a lazy subtree is built.
+    """
+
+    def __init__(self, url_names, relative_paths=None):
+        self.url_names = url_names  # Mapping of listing key -> URL name
+        # Mapping of listing key -> path under the listing, "<key>/" by default
+        self.relative_paths = relative_paths or {}
+        self._resolver = None
+        self._paths = {}
+        self._deferred = {}  # Entries listed relative to the request
+        self._lock = Lock()
+
+    def _get_entry(self, namespace):
+        resolver = get_resolver(get_urlconf())
+        key = (get_script_prefix(), get_language(), namespace)
+        with self._lock:
+            if resolver is not self._resolver:
+                # The URLconf was reloaded or swapped, forget everything
+                self._resolver = resolver
+                self._paths = {}
+                self._deferred = {}
+            entry = self._paths.get(key)
+            deferred = self._deferred.get(key)
+        if entry is None:
+            builds = LazySubtreeResolver.builds
+            if deferred is not None and deferred[0] == builds:
+                # Reversing would still need a lazy subtree built
+                return deferred[1]
+            paths = {}
+            try:
+                with defer_lazy_subtrees():
+                    for name, url_name in self.url_names.items():
+                        if namespace:
+                            url_name = f"{namespace}:{url_name}"
+                        try:
+                            paths[name] = django_reverse(url_name)
+                        except NoReverseMatch:
+                            paths[name] = None
+            except SubtreeNotBuilt:
+                paths = dict.fromkeys(self.url_names)
+                entry = (paths, self._get_digest(paths))
+                with self._lock:
+                    if resolver is self._resolver:
+                        self._deferred[key] = (builds, entry)
+                return entry
+            entry = (paths, self._get_digest(paths))
+            with self._lock:
+                if resolver is self._resolver:
+                    self._paths[key] = entry
+        return entry
+
+    def _get_digest(self, paths):
+        return hashlib.sha256(repr(sorted(paths.items())).encode()).hexdigest()
+
+    def _get_relative_url(self, request, name):
+        # The URL of the child `name`, under the URL of the listing
+        base = request.path if request.path.endswith("/") else f"{request.path}/"
+        path = self.relative_paths.get(name, f"{name}/")
+        return request.build_absolute_uri(f"{base}{path}")
+
+    def get_etag(self, request, namespace=None):
+        """
+        Return a strong ETag for the listing `request` would receive, or None
+        when it cannot be known without rendering (DRF versioning schemes).
+        The tag covers the reversed paths as well as everything the rendered
+        body depends on: host, request path and the negotiated format.
+        """
+        if getattr(request, "versioning_scheme", None) is not None:
+            return None
+        _paths, digest = self._get_entry(namespace)
+        variant = "|".join(
+            (
+                digest,
+                request.build_absolute_uri(),
+                request.META.get("HTTP_ACCEPT", ""),
+            )
+        )
+        return '"%s"' % hashlib.sha256(variant.encode()).hexdigest()
+
+    def reverse_all(self, request, namespace=None):
+        """
+        Return an ordered mapping of listing key -> absolute URL for `request`.
+        Unknown URL names fall back to a path under the URL of the listing.
+        """
+        ret = OrderedDict()
+        if getattr(request, "versioning_scheme", None) is not None:
+            for name, url_name in self.url_names.items():
+                if namespace:
+                    url_name = f"{namespace}:{url_name}"
+                try:
+                    ret[name] = reverse(url_name, request=request)
+                except NoReverseMatch:
+                    ret[name] = self._get_relative_url(request, name)
+            return ret
+
+        paths, _digest = self._get_entry(namespace)
+        for name, path in paths.items():
+            if path is None:
+                ret[name] = self._get_relative_url(request, name)
+            else:
+                ret[name] = preserve_builtin_query_params(
+                    request.build_absolute_uri(path), request
+                )
+        return ret
+
+
+def etag_matches(request, etag):
+    """
+    Return True if the `If-None-Match` header of `request` matches `etag`,
+    using the weak comparison required for GET and HEAD requests.
+    """
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if "*" in etags:
+        return True
+    return _strip_weak(etag) in {_strip_weak(tag) for tag in etags}
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith("W/") else etag
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from importlib.util import find_spec
+
+from django.urls import path, re_path
+from django.urls.resolvers import RegexPattern, URLResolver
+from django.utils.module_loading import import_string
+
+from .resolvers import LazySubtreeResolver
+from .utils import logger
+
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotError(ValueError):
+    """
+    Raised when a route table cannot be written to or read from a snapshot.
+    """
+
+
+def get_import_path(obj):
+    """
+    Return the dotted path `obj` can be imported from, or raise SnapshotError
+    if it is not importable (a class defined in a function for instance).
+    """
+    module = getattr(obj, "__module__", None)
+    name = getattr(obj, "__qualname__", None) or getattr(obj, "__name__", None)
+    if not module or not name or "<locals>" in name:
+        raise SnapshotError(f"{obj!r} cannot be imported by path")
+    import_path = f"{module}.{name}"
+    try:
+        imported = import_string(import_path)
+    except ImportError as e:
+        raise SnapshotError(f"{obj!r} cannot be imported by path") from e
+    if imported is not obj:
+        raise SnapshotError(f"{import_path} does not point to {obj!r}")
+    return import_path
+
+
+def dump_value(value):
+    """
+    Convert a ViewSet initkwarg to JSON. Classes and functions (serializers,
+    permission classes...) are stored by import path.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return {"__list__": [dump_value(item) for item in value]}
+    if isinstance(value, dict):
+        return {"__dict__": [[key, dump_value(item)] for key, item in value.items()]}
+    if isinstance(value, type) or callable(value):
+        return {"__import__": get_import_path(value)}
+    raise SnapshotError(f"{value!r} cannot be stored in a route snapshot")
+
+
+def load_value(value):
+    if isinstance(value, dict):
+        if "__list__" in value:
+            return [load_value(item) for item in value["__list__"]]
+        if "__dict__" in value:
+            return {key: load_value(item) for key, item in value["__dict__"]}
+        return import_string(value["__import__"])
+    return value
+
+
+def iter_url_patterns(patterns):
+    """
+    Yield the URL patterns in `patterns`, looking into the resolvers that
+    group the routes of a ViewSet. Subtrees that are not built yet are
+    skipped rather than built.
+    """
+    for pattern in patterns:
+        if isinstance(pattern, LazySubtreeResolver) and not pattern.is_built:
+            continue
+        if isinstance(pattern, URLResolver):
+            yield from iter_url_patterns(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+def read_json(filename, version, key):
+    """
+    Return the data stored in the JSON file `filename` if it was written with
+    `write_json()` for `version` and `key`, otherwise None.
+    """
+    try:
+        with open(filename, encoding="utf-8") as json_file:
+            data = json.load(json_file)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(data, dict)
+        or data.get("version") != version
+        or data.get("key") != key
+    ):
+        return None
+    return data
+
+
+def write_json(filename, data):
+    """
+    Atomically write `data` to the JSON file `filename`.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as json_file:
+            json.dump(data, json_file)
+        os.replace(tmp_name, filename)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def get_module_signature(obj):
+    """
+    Identify the source of the module defining `obj`, or of the module an
+    import path points to, so that editing a view module invalidates the
+    snapshot even if the registrations are the same.
+    """
+    if isinstance(obj, str):
+        module_name = obj.rpartition(".")[0]
+    else:
+        module_name = getattr(obj, "__module__", None)
+    return get_source_file_signature(module_name)
+
+
+def get_mro_signatures(obj, signatures=None):
+    """
+    Identify the sources of the modules defining `obj` and, for a class, its
+    base classes, since a ViewSet's actions and initkwargs may be inherited.
+    `signatures` caches them by module name between calls.
+    """
+    if signatures is None:
+        signatures = {}
+    if not isinstance(obj, type):
+        return [get_module_signature(obj)]
+    module_names = dict.fromkeys(cls.__module__ for cls in obj.__mro__)
+    module_names.pop("builtins", None)
+    result = []
+    for module_name in module_names:
+        if module_name not in signatures:
+            signatures[module_name] = get_source_file_signature(module_name)
+        result.append([module_name, signatures[module_name]])
+    return result
+
+
+def get_source_file_signature(module_name):
+    """
+    Identify the source file of the module `module_name`, located without
+    importing it if it is not imported yet.
+    """
+    module = sys.modules.get(module_name)
+    filename = getattr(module, "__file__", None)
+    if module is None and module_name:
+        # Not imported yet: locate it without importing it
+        try:
+            spec = find_spec(module_name)
+        except (ImportError, ValueError):
+            spec = None
+        filename = spec.origin if spec is not None else None
+    if not filename:
+        return None
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [filename, stat.st_mtime_ns, stat.st_size]
+
+
+class RouteSnapshot:
+    """
+    The resolved routes of every ViewSet of a router, keyed by prefix.
+
+    Rebuilding a ViewSet's patterns from a snapshot skips `get_routes()`,
+    `get_method_map()` and the lookup regex introspection: only `as_view()`
+    is called with the stored actions and initkwargs.
+    """
+
+    def __init__(self, key, viewsets=None):
+        self.key = key
+        self.viewsets = viewsets if viewsets is not None else {}
+
+    @classmethod
+    def load(cls, filename, key):
+        """
+        Return the snapshot stored in `filename`, or None if it is missing,
+        unreadable or was taken for other registrations.
+        """
+        data = read_json(filename, SNAPSHOT_VERSION, key)
+        if data is None:
+            return None
+        return cls(key, data["viewsets"])
+
+    def save(self, filename):
+        """
+        Atomically write the snapshot to `filename`.
+        """
+        write_json(
+            filename,
+            {"version": SNAPSHOT_VERSION, "key": self.key, "viewsets": self.viewsets},
+        )
+
+    def add_viewset(self, prefix, viewset, patterns):
+        """
+        Record the patterns generated for `viewset` at `prefix`.
+        """
+        routes = []
+        for pattern in iter_url_patterns(patterns):
+            callback = pattern.callback
+            routes.append(
+                {
+                    "route": str(pattern.pattern),
+                    "regex": isinstance(pattern.pattern, RegexPattern),
+                    "name": pattern.name,
+                    "actions": callback.actions,
+                    "initkwargs": dump_value(callback.initkwargs),
+                }
+            )
+        self.viewsets[prefix] = {"view": get_import_path(viewset), "routes": routes}
+
+    def get_viewset_urls(self, viewset, prefix):
+        """
+        Rebuild the patterns of `viewset` at `prefix`, or return None if the
+        snapshot has no routes for it.
+        """
+        entry = self.viewsets.get(prefix)
+        if entry is None or entry["view"] != get_import_path(viewset):
+            return None
+        urls = []
+        for route in entry["routes"]:
+            view = viewset.as_view(route["actions"], **load_value(route["initkwargs"]))
+            make_pattern = re_path if route["regex"] else path
+            urls.append(make_pattern(route["route"], view, name=route["name"]))
+        return urls
+
+
+def get_snapshot_key(items):
+    """
+    Hash the JSON serializable `items` describing a router's registrations.
+    """
+    payload = json.dumps([SNAPSHOT_VERSION, items], sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def log_snapshot_error(filename, error):
+    logger.warning("The route snapshot %s cannot be used: %s", filename, error)
@@ -0,0 +1,148 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import connections, transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.template.response import SimpleTemplateResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .reverse import etag_matches
+
+try:
+    from asgiref.sync import iscoroutinefunction
+except ImportError:  # asgiref < 3.6
+    from asyncio import iscoroutinefunction
+
+
+def is_async_view(view):
+    """
+    Return True if `view` (a view function, or a view class whose `as_view()`
+    returns a coroutine function) runs natively on an ASGI server.
+    """
+    if isinstance(view, type):
+        return bool(getattr(view, "view_is_async", False))
+    return iscoroutinefunction(view)
+
+
+# Lists the children of a router node. A single class serves the API root and
+# every intermediate view, the listing of each one is given through the
+# `reverse_cache` initkwarg of `as_view()`. Not a docstring: DRF would show it
+# as the description of every listing, in OPTIONS responses and the browsable
+# API.
+class APIRootView(APIView):
+    _ignore_model_permissions = True
+    schema = None  # Exclude from schema if necessary
+    reverse_cache = None  # ReverseCache of the listed children
+    cache_max_age = None  # Cache-Control max-age, if any
+
+    def get(self, request, *args, **kwargs):
+        namespace = request.resolver_match.namespace
+        # Browsable API pages show the user and a CSRF token, which the ETag
+        # does not cover: only the other formats are cached
+        cacheable = request.accepted_renderer.media_type != "text/html"
+        etag = self.reverse_cache.get_etag(request, namespace) if cacheable else None
+        if etag is not None and etag_matches(request, etag):
+            # Answer conditional requests before building the listing
+            response = HttpResponseNotModified()
+        else:
+            response = Response(self.reverse_cache.reverse_all(request, namespace))
+        if etag is not None:
+            response["ETag"] = etag
+            patch_vary_headers(response, ("Accept",))
+        if cacheable and self.cache_max_age is not None:
+            patch_cache_control(response, max_age=self.cache_max_age)
+        return response
+
+
+class AsyncAPIRootView(APIRootView):
+    """
+    APIRootView whose `as_view()` returns a coroutine function, so ASGI
+    servers call it on the event loop instead of a thread of the
+    `sync_to_async` pool. DRF's request handling runs inline: authentication
+    is left lazy since nothing in the listing depends on the user, which
+    requires permissions allowing anyone and no throttling
+    (`can_run_async()`). JSON is rendered before returning, browsable API
+    pages, whose templates may load the user, are rendered in a thread.
+    """
+
+    @classmethod
+    def can_run_async(cls):
+        return not cls.throttle_classes and all(
+            isinstance(permission, type) and issubclass(permission, AllowAny)
+            for permission in cls.permission_classes
+        )
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        # The listing needs no transaction, and ATOMIC_REQUESTS rejects
+        # coroutine views
+        for alias in connections:
+            async_view = transaction.non_atomic_requests(using=alias)(async_view)
+        return async_view
+
+    def perform_authentication(self, request):
+        pass
+
+    # Named and described as the sync view, in OPTIONS responses and the
+    # browsable API
+    def get_view_name(self):
+        return APIRootView().get_view_name()
+
+    def get_view_description(self, html=False):
+        return APIRootView().get_view_description(html)
+
+    async def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if not isinstance(response, SimpleTemplateResponse):
+            return response
+        if isinstance(response.accepted_renderer, BrowsableAPIRenderer):
+            await sync_to_async(response.render)()
+        else:
+            response.render()
+        # Django renders template responses in a thread, even rendered ones:
+        # hand it a plain response instead.
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        rendered.cookies = response.cookies
+        return rendered
+
+
+class PlainTextRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            # Error responses (authentication, permission) are dicts
+            data = "\n".join(f"{key}: {value}" for key, value in data.items())
+        return data.encode(self.charset)
+
+
+class RouteMetricsView(APIView):
+    """
+    Exposes the `RouteMetrics` of an instrumented router, as JSON or in the
+    Prometheus text format (`?format=txt` or `Accept: text/plain`).
+    """
+
+    _ignore_model_permissions = True
+    schema = None
+    permission_classes = [IsAdminUser]
+    renderer_classes = [JSONRenderer, PlainTextRenderer]
+    route_metrics = None  # RouteMetrics of the router
+
+    def get(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == "txt":
+            return Response(self.route_metrics.as_text())
+        return Response(self.route_metrics.as_dict())
@@ -93,6 +93,7 @@ def pytest_configure():
             "django.contrib.messages",
             "django.contrib.staticfiles",
             "rest_framework",
+            "hybridrouter",
             "tests",
         ],
         REST_FRAMEWORK={
@@ -0,0 +1,16 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import ViewSet
+
+
+class ReportView(APIView):
+    def get(self, request):
+        return Response({"report": True})
+
+
+class ReportViewSet(ViewSet):
+    def list(self, request):
+        return Response([])
+
+    def retrieve(self, request, pk=None):
+        return Response({"pk": pk})
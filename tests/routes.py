@@ -0,0 +1,42 @@
+from django.http import JsonResponse
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from hybridrouter.discovery import route
+
+from .viewsets import ActionItemViewSet
+
+
+@route("discovered/items", basename="discovered-item")
+class DiscoveredViewSet(ActionItemViewSet):
+    pass
+
+
+class UnmarkedViewSet(DiscoveredViewSet):
+    pass
+
+
+@route("discovered/view", basename="discovered-view")
+class DiscoveredView(APIView):
+    def get(self, request):
+        return Response({"discovered": True})
+
+
+@route("discovered/function", basename="discovered-function")
+@route("discovered/function-alias", basename="discovered-function-alias")
+@api_view(["GET"])
+def discovered_function(request):
+    return Response({"function": True})
+
+
+class AttributeView(APIView):
+    hybridrouter_routes = [("discovered/attribute", "discovered-attribute")]
+
+    def get(self, request):
+        return Response({"attribute": True})
+
+
+@route("discovered/async", basename="discovered-async")
+async def discovered_async_view(request):
+    return JsonResponse({"async": True})
@@ -1,11 +1,15 @@
+import contextvars
+import io
+import json
 import types
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import pytest
 from django.test import override_settings
-from django.urls import include, path, reverse
+from django.urls import clear_script_prefix, include, path, reverse, set_script_prefix
 from django.urls.resolvers import get_resolver
 from rest_framework import status
+from rest_framework.permissions import AllowAny
 from rest_framework.routers import DefaultRouter
 from rest_framework.test import APIClient, APIRequestFactory
 
@@ -14,7 +18,7 @@ from hybridrouter import TreeNode
 from .conftest import recevoir_test_url_resolver
 from .models import Item
 from .views import ItemView, item_view
-from .viewsets import EmptyViewSet, ItemViewSet, SlugItemViewSet
+from .viewsets import ActionItemViewSet, EmptyViewSet, ItemViewSet, SlugItemViewSet
 
 
 def create_urlconf(router):
@@ -660,3 +664,2149 @@ def test_namespace_in_get_api_root_view(hybrid_router):
     expected_data = {"child": "http://testserver/child/"}
     assert response.status_code == 200
     assert response.data == expected_data
+
+
+def test_urls_are_memoized(hybrid_router):
+    hybrid_router.register("items", ItemViewSet, basename="item")
+
+    with patch.object(
+        hybrid_router, "get_urls", wraps=hybrid_router.get_urls
+    ) as get_urls:
+        first = hybrid_router.urls
+        second = hybrid_router.urls
+
+    assert get_urls.call_count == 1
+    assert first is second
+    assert all(a is b for a, b in zip(first, second))
+
+
+def test_register_invalidates_memoized_urls(hybrid_router, db):
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    first = hybrid_router.urls
+
+    hybrid_router.register("users", ItemViewSet, basename="user")
+    second = hybrid_router.urls
+    assert second is not first
+
+    nested_router = DefaultRouter()
+    nested_router.register("subitems", ItemViewSet, basename="subitem")
+    hybrid_router.register_nested_router("nested/", nested_router)
+    third = hybrid_router.urls
+    assert third is not second
+
+    urlconf = create_urlconf(hybrid_router)
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        assert reverse("user-list") == "/users/"
+        response = APIClient().get("/nested/subitems/")
+        assert response.status_code == status.HTTP_200_OK
+
+
+def _build_mixed_router(**attrs):
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    for attr, value in attrs.items():
+        setattr(router, attr, value)
+    router.register("items", ItemViewSet, basename="item")
+    router.register("slug-items", SlugItemViewSet, basename="slug-item")
+    router.register("items-view", ItemView, basename="item-view")
+    router.register("level1/level2/view", item_view, basename="deep-view")
+    router.register("level1/other", ItemView, basename="other-view")
+    nested_router = DefaultRouter()
+    nested_router.register("subitems", ItemViewSet, basename="subitem")
+    router.register_nested_router("nested/", nested_router)
+    return router
+
+
+TREE_RESOLVER_PATHS = [
+    "/",
+    "/items/",
+    "/items",
+    "/items/1/",
+    "/items/1",
+    "/slug-items/some-name/",
+    "/items-view/",
+    "/level1/",
+    "/level1/level2/",
+    "/level1/level2/view/",
+    "/level1/other/",
+    "/nested/",
+    "/nested/subitems/",
+    "/nested/subitems/3/",
+    "/api/items/1/",
+]
+
+
+@pytest.mark.parametrize("path_info", TREE_RESOLVER_PATHS)
+def test_tree_resolver_matches_flat_patterns(path_info):
+    from django.urls import Resolver404, resolve
+
+    flat_router = _build_mixed_router()
+    tree_router = _build_mixed_router(use_tree_resolver=True)
+
+    flat_urlconf = types.ModuleType("flat_urlconf")
+    flat_urlconf.urlpatterns = [
+        path("", include(flat_router.urls)),
+        path("api/", include((flat_router.urls, "api"), namespace="api")),
+    ]
+    tree_urlconf = types.ModuleType("tree_urlconf")
+    tree_urlconf.urlpatterns = [
+        path("", include(tree_router.urls)),
+        path("api/", include((tree_router.urls, "api"), namespace="api")),
+    ]
+
+    def describe(urlconf):
+        try:
+            match = resolve(path_info, urlconf)
+        except Resolver404:
+            return None
+        return (
+            getattr(match.func, "cls", match.func).__name__,
+            getattr(match.func, "actions", None),
+            match.kwargs,
+            match.url_name,
+            match.namespace,
+            match.route,
+        )
+
+    assert describe(tree_urlconf) == describe(flat_urlconf)
+
+    with override_settings(ROOT_URLCONF=tree_urlconf):
+        assert reverse("item-detail", kwargs={"pk": 1}) == "/items/1/"
+        assert reverse("api:deep-view") == "/api/level1/level2/view/"
+
+
+def test_register_only_rebuilds_touched_subtree(hybrid_router):
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    hybrid_router.register("mods/client", ItemView, basename="mods-client")
+    first = hybrid_router.urls
+    items_patterns = hybrid_router.root_node.children["items"].subtree_patterns
+
+    hybrid_router.register("mods/server", ItemView, basename="mods-server")
+    with patch.object(
+        hybrid_router, "_get_viewset_urls", wraps=hybrid_router._get_viewset_urls
+    ) as get_viewset_urls:
+        second = hybrid_router.urls
+
+    # The "items" subtree was not touched, its patterns are reused as is
+    get_viewset_urls.assert_not_called()
+    assert hybrid_router.root_node.children["items"].subtree_patterns is items_patterns
+    assert all(pattern in second for pattern in items_patterns)
+    assert len(second) == len(first) + 1
+
+
+def test_basename_conflict_resolved_at_registration(hybrid_router):
+    hybrid_router.register("items1", ItemViewSet)
+    assert hybrid_router.root_node.children["items1"].basename == "item"
+
+    hybrid_router.register("items2", ItemViewSet)
+    hybrid_router.register("items3", ItemViewSet)
+    basenames = [
+        hybrid_router.root_node.children[prefix].basename
+        for prefix in ("items1", "items2", "items3")
+    ]
+    assert basenames == ["item_1", "item_2", "item_3"]
+
+
+def test_register_same_prefix_twice_last_registration_wins(hybrid_router):
+    hybrid_router.register("other", ItemView, basename="item")
+    hybrid_router.register("items", ItemViewSet, basename="set")
+    # Registered last with the basename used first, the view still wins
+    hybrid_router.register("items", ItemView, basename="item")
+
+    node = hybrid_router.root_node.get_child("items")
+    assert node.view is ItemView
+    assert not node.is_viewset
+    assert node.basename == "item_2"
+    # The replaced registration still counts in basename conflicts
+    assert [(str(url.pattern), url.name) for url in hybrid_router.urls] == [
+        ("other/", "item_1"),
+        ("items/", "item_2"),
+        ("", "api-root"),
+    ]
+
+
+def test_build_config_change_rebuilds_all_subtrees(hybrid_router):
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    assert str(hybrid_router.get_urls()[0].pattern) == "^items/$"
+
+    hybrid_router.trailing_slash = ""
+    assert str(hybrid_router.get_urls()[0].pattern) == "^items$"
+
+
+def test_api_root_reverses_once_per_urlconf(hybrid_router, db):
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    hybrid_router.register("users", ItemViewSet, basename="user")
+
+    urlconf = create_urlconf(hybrid_router)
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        client = APIClient()
+        with patch(
+            "hybridrouter.reverse.django_reverse", wraps=reverse
+        ) as reverse_mock:
+            for _ in range(3):
+                response = client.get("/")
+                assert response.json() == {
+                    "items": "http://testserver/items/",
+                    "users": "http://testserver/users/",
+                }
+        assert reverse_mock.call_count == 2
+
+        # The script prefix is part of the cache key
+        set_script_prefix("/prefix/")
+        try:
+            response = client.get("/")
+        finally:
+            clear_script_prefix()
+        assert response.json() == {
+            "items": "http://testserver/prefix/items/",
+            "users": "http://testserver/prefix/users/",
+        }
+
+
+def test_api_root_reverse_cache_with_namespace(hybrid_router, db):
+    hybrid_router.register("items/list", ItemView, basename="item-list-view")
+
+    urlconf = types.ModuleType("namespaced_urlconf")
+    urlconf.urlpatterns = [
+        path("", include(hybrid_router.urls)),
+        path("api/", include((hybrid_router.urls, "api"), namespace="api")),
+    ]
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        client = APIClient()
+        response = client.get("/")
+        assert response.json() == {"items": "http://testserver/items/"}
+        response = client.get("/api/")
+        assert response.json() == {"items": "http://testserver/api/items/"}
+        response = client.get("/api/items/")
+        assert response.json() == {"list": "http://testserver/api/items/list/"}
+
+
+def test_api_root_etag_not_modified(hybrid_router, db):
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    hybrid_router.register("mods/client", ItemView, basename="mods-client")
+
+    urlconf = create_urlconf(hybrid_router)
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        client = APIClient()
+        etags = {}
+        for url in ("/", "/mods/"):
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            etag = etags[url] = response["ETag"]
+            assert "Cache-Control" not in response
+
+            with patch("hybridrouter.reverse.ReverseCache.reverse_all") as reverse_all:
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            reverse_all.assert_not_called()
+            assert response.status_code == status.HTTP_304_NOT_MODIFIED
+            assert response["ETag"] == etag
+            assert response.content == b""
+
+        # The listing depends on the host, so does the ETag
+        response = client.get("/", HTTP_HOST="example.com")
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etags["/"]
+
+
+def test_api_root_cache_control(hybrid_router, db):
+    from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+    from hybridrouter.views import APIRootView
+
+    hybrid_router.api_root_cache_max_age = 300
+    hybrid_router.register("items", ItemViewSet, basename="item")
+
+    urlconf = create_urlconf(hybrid_router)
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        client = APIClient()
+        response = client.get("/")
+        assert response["Cache-Control"] == "max-age=300"
+
+        response = client.get("/", HTTP_IF_NONE_MATCH=response["ETag"])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["Cache-Control"] == "max-age=300"
+
+        # Browsable API pages depend on the user: neither tagged nor cached
+        renderers = [JSONRenderer, BrowsableAPIRenderer]
+        with patch.object(APIRootView, "renderer_classes", renderers):
+            response = client.get(
+                "/", HTTP_ACCEPT="text/html", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        assert response.status_code == status.HTTP_200_OK
+        assert "ETag" not in response
+        assert "Cache-Control" not in response
+
+
+def _describe_match(path_info, urlconf):
+    from django.urls import Resolver404, resolve
+
+    try:
+        match = resolve(path_info, urlconf)
+    except Resolver404:
+        return None
+    return (
+        getattr(match.func, "cls", match.func).__name__,
+        getattr(match.func, "actions", None),
+        match.kwargs,
+        match.url_name,
+        match.namespace,
+    )
+
+
+@pytest.mark.parametrize("trailing_slash", ["/", "", "/?"])
+def test_path_converters_match_regex_patterns(trailing_slash):
+    from hybridrouter import HybridRouter
+
+    urlconfs = []
+    routers = []
+    for use_path_converters in (False, True):
+        router = HybridRouter()
+        router.trailing_slash = trailing_slash
+        router.use_path_converters = use_path_converters
+        router.register("items", ItemViewSet, basename="item")
+        router.register("slug-items", SlugItemViewSet, basename="slug-item")
+        router.register("actions", ActionItemViewSet, basename="action")
+        urlconf = types.ModuleType(f"urlconf_{use_path_converters}")
+        urlconf.urlpatterns = [path("", include(router.urls))]
+        urlconfs.append(urlconf)
+        routers.append(router)
+
+    regex_urlconf, path_urlconf = urlconfs
+    regex_routes = [
+        str(url.pattern) for url in routers[1].urls if str(url.pattern).startswith("^")
+    ]
+    if trailing_slash == "/?":
+        # An optional slash keeps every route on re_path
+        assert [str(url.pattern) for url in routers[1].urls] == [
+            str(url.pattern) for url in routers[0].urls
+        ]
+    else:
+        # Only the routes with a custom regex url_path keep using re_path
+        assert regex_routes == [f"^actions/by-name/(?P<name>[^/.]+){trailing_slash}$"]
+
+    paths = [
+        "/items",
+        "/items/",
+        "/items/1",
+        "/items/1/",
+        "/items/1.json/",
+        "/slug-items/some-name/",
+        "/slug-items/some-name",
+        "/actions/",
+        "/actions/12/",
+        "/actions/abc/",
+        "/actions/recent/",
+        "/actions/recent",
+        "/actions/12/mark-read/",
+        "/actions/12/mark-read",
+        "/actions/by-name/foo/",
+    ]
+    for path_info in paths:
+        assert _describe_match(path_info, path_urlconf) == _describe_match(
+            path_info, regex_urlconf
+        ), path_info
+
+    names = [
+        ("item-list", {}),
+        ("item-detail", {"pk": 1}),
+        ("slug-item-detail", {"name": "some-name"}),
+        ("action-recent", {}),
+        ("action-mark-read", {"pk": 12}),
+    ]
+    for name, kwargs in names:
+        with override_settings(ROOT_URLCONF=regex_urlconf):
+            expected = reverse(name, kwargs=kwargs)
+        with override_settings(ROOT_URLCONF=path_urlconf):
+            assert reverse(name, kwargs=kwargs) == expected
+
+
+def test_compact_tree_nodes_and_registrations(hybrid_router):
+    hybrid_router.register("mods/client", ItemView, basename="mods-client")
+    hybrid_router.urls
+
+    mods = hybrid_router.root_node.get_child("mods")
+    leaf = mods.get_child("client")
+    assert not hasattr(leaf, "__dict__")
+    assert leaf._children is None
+    assert list(leaf.child_nodes()) == []
+    assert mods.has_children()
+
+    registration = hybrid_router.basename_registry["mods-client"][0]
+    assert not hasattr(registration, "__dict__")
+    assert registration.path_parts == ("mods", "client")
+    assert registration["prefix"] == "mods/client"
+    with pytest.raises(KeyError):
+        registration["unknown"]
+
+
+def test_api_root_views_share_a_single_class(hybrid_router, db):
+    hybrid_router.register("mods/client", ItemView, basename="mods-client")
+    hybrid_router.register("mods/server", ItemView, basename="mods-server")
+    hybrid_router.register("level1/level2/level3", ItemView, basename="item-deep")
+
+    root_view = hybrid_router.urls[-1].callback
+    intermediate_views = [
+        url.callback for url in hybrid_router.urls if url.name is None
+    ]
+    assert len(intermediate_views) == 3
+    assert {view.cls for view in intermediate_views} == {root_view.cls}
+
+    urlconf = create_urlconf(hybrid_router)
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        client = APIClient()
+        response = client.get("/mods/")
+        assert response.renderer_context["view"].get_view_name() == "Api Root"
+        assert client.options("/mods/").json()["description"] == ""
+        assert response.json() == {
+            "client": "http://testserver/mods/client/",
+            "server": "http://testserver/mods/server/",
+        }
+
+
+def _build_snapshot_router(snapshot_file):
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    router.route_snapshot = str(snapshot_file)
+    router.register("items", ItemViewSet, basename="item")
+    router.register("actions", ActionItemViewSet, basename="action")
+    router.register("items-view", ItemView, basename="item-view")
+    return router
+
+
+def test_route_snapshot_is_reused(tmp_path, db):
+    from hybridrouter import HybridRouter
+
+    snapshot_file = tmp_path / "routes.json"
+    first_router = _build_snapshot_router(snapshot_file)
+    expected = [(str(url.pattern), url.name) for url in first_router.urls]
+    assert snapshot_file.exists()
+
+    second_router = _build_snapshot_router(snapshot_file)
+    with patch.object(HybridRouter, "get_routes") as get_routes:
+        urls = second_router.urls
+    get_routes.assert_not_called()
+    assert [(str(url.pattern), url.name) for url in urls] == expected
+
+    urlconf = create_urlconf(second_router)
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        match = resolver.resolve("/actions/recent/")
+        assert match.func.initkwargs["permission_classes"] == [AllowAny]
+        response = APIClient().get("/actions/recent/")
+        assert response.json() == {"recent": True}
+
+
+def test_route_snapshot_rebuilt_when_registrations_change(tmp_path):
+    from hybridrouter import HybridRouter
+
+    snapshot_file = tmp_path / "routes.json"
+    _build_snapshot_router(snapshot_file).urls
+    first_snapshot = snapshot_file.read_text()
+
+    router = _build_snapshot_router(snapshot_file)
+    router.register("slug-items", SlugItemViewSet, basename="slug-item")
+    with patch.object(
+        HybridRouter, "get_routes", autospec=True, side_effect=HybridRouter.get_routes
+    ) as get_routes:
+        urls = router.urls
+    assert get_routes.call_count == 3
+    assert "slug-item-detail" in [getattr(url, "name", None) for url in urls]
+    assert snapshot_file.read_text() != first_snapshot
+
+
+def test_route_snapshot_rebuilt_when_base_class_changes(tmp_path):
+    from hybridrouter import HybridRouter, snapshot
+
+    from .routes import DiscoveredViewSet
+
+    snapshot_file = tmp_path / "routes.json"
+    router = _build_snapshot_router(snapshot_file)
+    router.register("discovered", DiscoveredViewSet, basename="discovered")
+    router.urls
+    get_source_file_signature = snapshot.get_source_file_signature
+
+    def edited_signature(module_name):
+        # The actions of DiscoveredViewSet are inherited from tests.viewsets
+        signature = get_source_file_signature(module_name)
+        return signature + ["edited"] if module_name == "tests.viewsets" else signature
+
+    router = _build_snapshot_router(snapshot_file)
+    router.register("discovered", DiscoveredViewSet, basename="discovered")
+    with patch(
+        "hybridrouter.snapshot.get_source_file_signature", edited_signature
+    ), patch.object(
+        HybridRouter, "get_routes", autospec=True, side_effect=HybridRouter.get_routes
+    ) as get_routes:
+        router.urls
+    assert get_routes.call_count == 3
+
+
+def test_route_snapshot_unreadable_falls_back(tmp_path):
+    snapshot_file = tmp_path / "routes.json"
+    snapshot_file.write_text("not json")
+
+    router = _build_snapshot_router(snapshot_file)
+    url_names = {getattr(url, "name", None) for url in router.urls}
+    assert url_names >= {"item-list", "action-recent", "item-view"}
+    assert json.loads(snapshot_file.read_text())["version"] == 1
+
+
+@pytest.mark.parametrize("trailing_slash", ["/", "/?"])
+@pytest.mark.parametrize("use_tree_resolver", [False, True])
+def test_merged_viewset_routes_match_separate_patterns(
+    trailing_slash, use_tree_resolver
+):
+    from hybridrouter import HybridRouter
+    from hybridrouter.resolvers import ViewSetRoutesResolver
+
+    urlconfs = []
+    routers = []
+    for merge_viewset_routes in (False, True):
+        router = _build_mixed_router(use_tree_resolver=use_tree_resolver)
+        router.trailing_slash = trailing_slash
+        router.merge_viewset_routes = merge_viewset_routes
+        router.register("actions", ActionItemViewSet, basename="action")
+        urlconf = types.ModuleType(f"urlconf_merged_{merge_viewset_routes}")
+        urlconf.urlpatterns = [
+            path("", include(router.urls)),
+            path("api/", include((router.urls, "api"), namespace="api")),
+        ]
+        urlconfs.append(urlconf)
+        routers.append(router)
+
+    separate_urlconf, merged_urlconf = urlconfs
+    merged = [
+        url for url in routers[1].get_urls() if isinstance(url, ViewSetRoutesResolver)
+    ]
+    assert len(merged) == 3
+    assert not isinstance(routers[0].get_urls()[0], ViewSetRoutesResolver)
+
+    paths = TREE_RESOLVER_PATHS + [
+        "/items/1.json/",
+        "/actions/",
+        "/actions/12/",
+        "/actions/abc/",
+        "/actions/recent/",
+        "/actions/recent",
+        "/actions/12/mark-read/",
+        "/actions/by-name/foo/",
+        "/api/actions/12/mark-read/",
+    ]
+    for path_info in paths:
+        assert _describe_match(path_info, merged_urlconf) == _describe_match(
+            path_info, separate_urlconf
+        ), path_info
+
+    names = [
+        ("item-detail", {"pk": 1}),
+        ("action-recent", {}),
+        ("api:action-mark-read", {"pk": 12}),
+        ("api:action-by-name", {"name": "foo"}),
+    ]
+    for name, kwargs in names:
+        with override_settings(ROOT_URLCONF=separate_urlconf):
+            expected = reverse(name, kwargs=kwargs)
+        with override_settings(ROOT_URLCONF=merged_urlconf):
+            assert reverse(name, kwargs=kwargs) == expected
+
+    with override_settings(ROOT_URLCONF=merged_urlconf):
+        response = APIClient().get("/actions/recent/")
+        assert response.json() == {"recent": True}
+
+
+def test_instrumentation_disabled_leaves_views_untouched(hybrid_router):
+    from hybridrouter.instrumentation import InstrumentedResolver
+
+    hybrid_router.register("items-view", ItemView, basename="item-view")
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    with patch("hybridrouter.hybridrouter.instrument_patterns") as instrument:
+        urls = hybrid_router.urls
+    instrument.assert_not_called()
+    assert not any(isinstance(url, InstrumentedResolver) for url in urls)
+
+
+def test_instrumented_routes_record_hits_and_latencies(hybrid_router, db):
+    from django.contrib.auth.models import User
+
+    from hybridrouter.instrumentation import InstrumentedResolver
+
+    hybrid_router.instrument_routes = True
+    hybrid_router.metrics_prefix = "_metrics"
+    hybrid_router.register("items-view", ItemView, basename="item-view")
+    hybrid_router.register("apiitems-view", item_view, basename="apiitem-view")
+    hybrid_router.register("group/items", ItemViewSet, basename="item")
+    hybrid_router.register("group/other", ItemView, basename="other-view")
+    urls = hybrid_router.urls
+    assert isinstance(urls[0], InstrumentedResolver)
+
+    urlconf = create_urlconf(hybrid_router)
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        match = resolver.resolve("/group/items/1/")
+        assert match.func.cls is ItemViewSet
+        assert match.func.actions["get"] == "retrieve"
+        assert match.url_name == "item-detail"
+
+        client = APIClient()
+        for url in ("/items-view/", "/items-view/", "/apiitems-view/", "/group/"):
+            assert client.get(url).status_code == status.HTTP_200_OK
+        assert client.get("/group/items/").status_code == status.HTTP_200_OK
+        assert client.post("/group/items/", {}, format="json").status_code == 400
+        assert client.get("/_metrics/").status_code == status.HTTP_403_FORBIDDEN
+
+        metrics = hybrid_router.route_metrics.as_dict()["routes"]
+        by_key = {(item["route"], item["method"]): item for item in metrics}
+        assert set(by_key) == {
+            ("item-view", "GET"),
+            ("apiitem-view", "GET"),
+            ("group/", "GET"),
+            ("item-list", "GET"),
+            ("item-list", "POST"),
+        }
+        assert metrics[0]["route"] == "item-view"
+        item_view_metrics = by_key[("item-view", "GET")]
+        assert item_view_metrics["hits"] == 2
+        for key in ("resolve_seconds", "view_seconds"):
+            histogram = item_view_metrics[key]
+            assert histogram["count"] == 2
+            assert histogram["sum"] > 0
+            assert histogram["buckets"][-1] == ["+Inf", 2]
+
+        client.force_authenticate(User(username="admin", is_staff=True))
+        response = client.get("/_metrics/")
+        assert response.status_code == status.HTTP_200_OK
+        assert (
+            response.json()["routes"] == hybrid_router.route_metrics.as_dict()["routes"]
+        )
+        response = client.get("/_metrics/", HTTP_ACCEPT="text/plain")
+        assert response["Content-Type"] == "text/plain; charset=utf-8"
+        text = response.content.decode()
+        assert 'hybridrouter_route_hits_total{route="item-view",method="GET"} 2' in text
+        assert (
+            'hybridrouter_view_seconds_bucket{route="item-list",method="POST",le="+Inf"} 1'
+            in text
+        )
+
+    hybrid_router.route_metrics.reset()
+    assert hybrid_router.route_metrics.as_dict() == {"routes": []}
+
+
+def test_instrumented_async_view():
+    from asgiref.sync import async_to_sync, iscoroutinefunction
+
+    from hybridrouter.instrumentation import RouteMetrics, instrument_view
+
+    async def async_view(request):
+        return "response"
+
+    metrics = RouteMetrics()
+    view = instrument_view(async_view, metrics, "async-view")
+    assert iscoroutinefunction(view)
+    assert view.__wrapped__ is async_view
+
+    request = APIRequestFactory().get("/")
+    # Run outside of any resolve made by the previous tests
+    assert contextvars.Context().run(async_to_sync(view), request) == "response"
+    (item,) = metrics.as_dict()["routes"]
+    assert item["hits"] == 1
+    assert item["resolve_seconds"]["count"] == 0
+
+
+def _build_profiled_router(route_profile=None):
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    router.route_profile = route_profile
+    router.register("cold", ItemViewSet, basename="cold")
+    router.register("warm", ItemView, basename="warm")
+    router.register("<int:year>/report", ItemView, basename="report")
+    router.register("lukewarm", item_view, basename="lukewarm")
+    router.register("hot/items", ActionItemViewSet, basename="hot")
+    router.register("hot/other", ItemView, basename="hot-other")
+    return router
+
+
+def test_route_profile_orders_sibling_subtrees(tmp_path):
+    profile = {"warm": 5, "lukewarm": 2, "hot-list": 50, "hot-other": 100}
+    router = _build_profiled_router(profile)
+    order = [getattr(url, "name", None) or str(url.pattern) for url in router.urls]
+
+    def first(name):
+        return order.index(name)
+
+    # Hot siblings move ahead of cold ones, but never across the converter
+    # segment, and the patterns of a node keep their order.
+    assert first("warm") < first("cold-list") < first("report")
+    assert first("report") < first("hot/")
+    assert first("hot/") < first("hot-other") < first("hot-list")
+    assert first("hot-list") < first("lukewarm")
+    assert order.index("cold-list") + 1 == order.index("cold-detail")
+
+    # RouteMetrics output saved to a file gives the same order
+    profile_file = tmp_path / "profile.json"
+    profile_file.write_text(
+        json.dumps(
+            {
+                "routes": [
+                    {"route": route, "method": "GET", "hits": hits}
+                    for route, hits in profile.items()
+                ]
+            }
+        )
+    )
+    file_router = _build_profiled_router(str(profile_file))
+    assert [
+        getattr(url, "name", None) or str(url.pattern) for url in file_router.urls
+    ] == order
+
+    baseline = create_urlconf(_build_profiled_router())
+    ordered = create_urlconf(router)
+    paths = [
+        "/cold/",
+        "/cold/1/",
+        "/warm/",
+        "/2024/report/",
+        "/lukewarm/",
+        "/hot/",
+        "/hot/items/12/",
+        "/hot/items/recent/",
+        "/hot/other/",
+    ]
+    for path_info in paths:
+        assert _describe_match(path_info, ordered) == _describe_match(
+            path_info, baseline
+        ), path_info
+
+
+def test_verify_route_order_command(monkeypatch):
+    from django.core.management import CommandError, call_command
+
+    router = _build_profiled_router({"hot-other": 100, "warm": 5})
+    monkeypatch.setattr("tests.urls.router", router, raising=False)
+
+    stdout = io.StringIO()
+    call_command("verify_route_order", "tests.urls.router", stdout=stdout)
+    assert "paths resolve to the same routes" in stdout.getvalue()
+
+    def unsafe_order(blocks, weights):
+        return [patterns for _child, _prefix, patterns in reversed(blocks)]
+
+    # Moving the catch-all segment ahead of the literal prefixes changes
+    # which view "/cold/" resolves to.
+    router.register("<str:anything>", ItemView, basename="catch-all")
+    with patch("hybridrouter.hybridrouter.order_sibling_blocks", unsafe_order):
+        with pytest.raises(CommandError, match="resolve differently"):
+            call_command(
+                "verify_route_order",
+                "tests.urls.router",
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+
+
+def test_build_report(hybrid_router, caplog):
+    reports = []
+    hybrid_router.profile_build = True
+    hybrid_router.build_report_callback = reports.append
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    hybrid_router.register("group/actions", ActionItemViewSet, basename="item")
+    hybrid_router.register("group/view", ItemView, basename="view")
+    hybrid_router.register("group/function", item_view, basename="function")
+    hybrid_router.urls
+
+    (report,) = reports
+    assert hybrid_router.build_report is report
+    assert report.total > 0
+    phases = report.get_phases()
+    assert [item["seconds"] for item in phases] == sorted(
+        (item["seconds"] for item in phases), reverse=True
+    )
+    counts = {item["phase"]: item["count"] for item in phases}
+    assert counts["tree"] == counts["conflicts"] == 4
+    assert counts["introspection"] == 2
+    # 2 ItemViewSet routes, 5 ActionItemViewSet routes and the APIView
+    assert counts["as_view"] == 8
+    assert counts["intermediate_views"] == 2  # "group" and the API root
+    assert "snapshot" not in counts
+
+    registrations = report.get_registrations()
+    assert [item["seconds"] for item in registrations] == sorted(
+        (item["seconds"] for item in registrations), reverse=True
+    )
+    by_label = {item["registration"]: item for item in registrations}
+    assert set(by_label) == {
+        "",
+        "items",
+        "group",
+        "group/actions",
+        "group/view",
+        "group/function",
+    }
+    assert set(by_label["group/actions"]["phases"]) == {
+        "tree",
+        "conflicts",
+        "introspection",
+        "as_view",
+    }
+    assert json.loads(json.dumps(report.as_dict()))["total"] == report.total
+
+    # Without a callback the report is logged, and only the new registration
+    # is timed for the register phases.
+    hybrid_router.build_report_callback = None
+    hybrid_router.register("other", ItemView, basename="other")
+    with caplog.at_level("INFO", logger="hybridrouter"):
+        hybrid_router.urls
+    assert "Router built in" in caplog.text
+    registrations = hybrid_router.build_report.get_registrations()
+    assert {item["registration"] for item in registrations} == {"", "other"}
+
+
+def test_build_not_profiled_by_default(hybrid_router):
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    with patch("hybridrouter.hybridrouter.BuildReport") as build_report:
+        hybrid_router.urls
+    build_report.assert_not_called()
+    assert hybrid_router.build_report is None
+
+
+def test_viewset_introspection_shared_between_routers():
+    import gc
+
+    from rest_framework.viewsets import ViewSet
+
+    from hybridrouter import HybridRouter
+    from hybridrouter.introspection import (
+        _introspection_cache,
+        clear_viewset_introspection_cache,
+    )
+
+    class VersionedRouter(HybridRouter):
+        pass
+
+    clear_viewset_introspection_cache()
+    routers = []
+    for router_class in (HybridRouter, HybridRouter, VersionedRouter):
+        router = router_class()
+        router.cache_viewset_routes = True
+        router.register("items", ItemViewSet, basename="item")
+        routers.append(router)
+
+    with patch.object(
+        HybridRouter, "get_routes", autospec=True, side_effect=HybridRouter.get_routes
+    ) as get_routes:
+        patterns = [[str(url.pattern) for url in router.urls] for router in routers]
+        # Once for the HybridRouters, once for the subclass
+        assert get_routes.call_count == 2
+        assert patterns[0] == patterns[1] == patterns[2]
+
+        # Rebuilding after a registration reuses the cached routes
+        routers[0].register("other-items", ItemViewSet, basename="other-item")
+        routers[0].urls
+        assert get_routes.call_count == 2
+
+        clear_viewset_introspection_cache()
+        routers[1].register("other-items", ItemViewSet, basename="other-item")
+        routers[1].urls
+        assert get_routes.call_count == 3
+
+    # A redefined class (as after a reload) does not reuse the old entry,
+    # which goes away with the old class.
+    def define_viewset():
+        class ReloadedViewSet(ViewSet):
+            def list(self, request):
+                pass
+
+        return ReloadedViewSet
+
+    for _ in range(2):
+        router = HybridRouter()
+        router.cache_viewset_routes = True
+        router.register("reloaded", define_viewset(), basename="reloaded")
+        assert [url.name for url in router.urls][0] == "reloaded-list"
+    del router
+    gc.collect()
+    assert [viewset.__name__ for viewset in _introspection_cache.keys()] == [
+        "ItemViewSet"
+    ]
+
+
+def _build_nesting_router(**attrs):
+    from django.urls import URLResolver
+
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    for attr, value in attrs.items():
+        setattr(router, attr, value)
+    router.register("items", ItemViewSet, basename="item")
+    drf_router = DefaultRouter()
+    drf_router.register("subitems", ItemViewSet, basename="subitem")
+    router.register_nested_router("drf/", drf_router)
+    hybrid_router = HybridRouter()
+    hybrid_router.include_root_view = False
+    hybrid_router.register("actions", ActionItemViewSet, basename="action")
+    hybrid_router.register("group/view", ItemView, basename="nested-view")
+    router.register_nested_router("v1/hybrid-api/", hybrid_router)
+    nested_urls = router.urls
+    has_include = any(isinstance(url, URLResolver) for url in nested_urls)
+    return router, has_include
+
+
+def test_flatten_nested_routers():
+    from django.urls import resolve
+
+    included_router, has_include = _build_nesting_router()
+    assert has_include
+    flat_router, has_include = _build_nesting_router(flatten_nested_routers=True)
+    assert not has_include
+    tree_router, _ = _build_nesting_router(
+        flatten_nested_routers=True, use_tree_resolver=True
+    )
+
+    included = create_urlconf(included_router)
+    urlconfs = [create_urlconf(flat_router), create_urlconf(tree_router)]
+    paths = [
+        "/",
+        "/items/1/",
+        "/drf/",
+        "/drf/subitems/",
+        "/drf/subitems/3/",
+        "/drf/subitems.json",
+        "/drf/subitems/3.json",
+        "/v1/",
+        "/v1/hybrid-api/",
+        "/v1/hybrid-api/actions/",
+        "/v1/hybrid-api/actions/12/mark-read/",
+        "/v1/hybrid-api/actions/by-name/foo/",
+        "/v1/hybrid-api/group/",
+        "/v1/hybrid-api/group/view/",
+        "/v1/hybrid-api/missing/",
+    ]
+    for urlconf in urlconfs:
+        for path_info in paths:
+            assert _describe_match(path_info, urlconf) == _describe_match(
+                path_info, included
+            ), path_info
+    for path_info in paths:
+        if _describe_match(path_info, included) is None:
+            continue
+        expected = resolve(path_info, included).route
+        assert resolve(path_info, urlconfs[0]).route == expected, path_info
+        assert resolve(path_info, urlconfs[1]).route == expected, path_info
+    assert resolve("/drf/subitems/3/", included).route == (
+        "drf/subitems/(?P<pk>[^/.]+)/$"
+    )
+
+    names = [
+        ("subitem-detail", {"pk": 3}),
+        ("action-mark-read", {"pk": 12}),
+        ("nested-view", {}),
+    ]
+    for name, kwargs in names:
+        with override_settings(ROOT_URLCONF=included):
+            expected = reverse(name, kwargs=kwargs)
+        for urlconf in urlconfs:
+            with override_settings(ROOT_URLCONF=urlconf):
+                assert reverse(name, kwargs=kwargs) == expected
+
+
+def test_flatten_nested_routers_falls_back_to_include():
+    from django.urls import URLResolver
+
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    router.flatten_nested_routers = True
+    nested_router = HybridRouter()
+    nested_router.merge_viewset_routes = True
+    nested_router.register("items", ItemViewSet, basename="item")
+    router.register_nested_router("nested/", nested_router)
+    (nested,) = [url for url in router.urls if isinstance(url, URLResolver)]
+    assert str(nested.pattern) == "nested/"
+
+
+def test_register_many(hybrid_router, db):
+    hybrid_router.register("items1", ItemViewSet)
+    hybrid_router.register_many(
+        [
+            ("items2", ItemViewSet),
+            ("group/view", ItemView, "group-view"),
+            ("group/function", item_view, "group-function"),
+        ]
+    )
+    hybrid_router.register_many({"items3": ItemViewSet, "other": (ItemView, "other")})
+
+    assert [reg.basename for reg in hybrid_router.basename_registry["item"]] == [
+        "item_1",
+        "item_2",
+        "item_3",
+    ]
+    urlconf = create_urlconf(hybrid_router)
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        resolver = get_resolver(urlconf)
+        recevoir_test_url_resolver(resolver.url_patterns)
+
+        assert reverse("item_1-list") == "/items1/"
+        assert reverse("item_3-list") == "/items3/"
+        assert reverse("group-function") == "/group/function/"
+        assert reverse("other") == "/other/"
+        response = APIClient().get("/group/")
+        assert response.json() == {
+            "view": "http://testserver/group/view/",
+            "function": "http://testserver/group/function/",
+        }
+
+
+def test_register_many_is_transactional(hybrid_router):
+    from django.core.exceptions import ImproperlyConfigured
+
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    urls = hybrid_router.urls
+    with pytest.raises(ImproperlyConfigured) as excinfo:
+        hybrid_router.register_many(
+            [
+                ("valid", ItemView, "valid"),
+                ("items", ItemViewSet, "other-item"),
+                ("twice", ItemView, "twice"),
+                ("/twice/", ItemView, "twice-again"),
+                ("not-a-view", object(), "not-a-view"),
+                ("no-basename", ItemView),
+            ]
+        )
+    message = str(excinfo.value)
+    assert "items: already registered" in message
+    assert "/twice/: registered more than once" in message
+    assert "not-a-view: <object object" in message
+    assert "no-basename: `basename` argument not specified" in message
+    assert "valid" not in hybrid_router.root_node.children
+    assert hybrid_router.urls is urls
+
+
+def test_bulk_register_defers_registrations(hybrid_router):
+    from hybridrouter import HybridRouter
+
+    hybrid_router.register("items", ItemViewSet, basename="item")
+    hybrid_router.urls
+    nested_router = DefaultRouter()
+    nested_router.register("subitems", ItemViewSet, basename="subitem")
+
+    with patch.object(
+        HybridRouter, "_add_route", autospec=True, side_effect=HybridRouter._add_route
+    ) as add_route:
+        with hybrid_router.bulk_register():
+            hybrid_router.register("a/view", ItemView, basename="a-view")
+            with hybrid_router.bulk_register():
+                hybrid_router.register_many([("a/items", ItemViewSet, "item")])
+            hybrid_router.register_nested_router("nested/", nested_router)
+            # Nothing is applied before the block exits
+            assert hybrid_router.root_node.get_child("a") is None
+            assert hasattr(hybrid_router, "_urls")
+    add_route.assert_not_called()
+    assert list(hybrid_router.root_node.children) == ["items", "a", "nested"]
+    assert [reg.basename for reg in hybrid_router.basename_registry["item"]] == [
+        "item_1",
+        "item_2",
+    ]
+    names = {getattr(url, "name", None) for url in hybrid_router.urls}
+    assert {"item_1-list", "item_2-list", "a-view"} <= names
+
+    with pytest.raises(RuntimeError):
+        with hybrid_router.bulk_register():
+            hybrid_router.register("discarded", ItemView, basename="discarded")
+            raise RuntimeError
+    assert hybrid_router.root_node.get_child("discarded") is None
+
+
+DISCOVERED_PATHS = [
+    "/discovered/",
+    "/discovered/items/",
+    "/discovered/items/1/",
+    "/discovered/items/recent/",
+    "/discovered/items/1/mark-read/",
+    "/discovered/items/by-name/some-name/",
+    "/discovered/view/",
+    "/discovered/function/",
+    "/discovered/function-alias/",
+    "/discovered/attribute/",
+    "/discovered/async/",
+]
+
+
+def _build_discovered_router(manifest=None):
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    router.register("items", ItemViewSet, basename="item")
+    router.autodiscover(modules=["routes"], manifest=manifest)
+    return router
+
+
+def test_autodiscover_registers_marked_views(tmp_path):
+    from hybridrouter import HybridRouter
+
+    from .routes import (
+        AttributeView,
+        DiscoveredView,
+        DiscoveredViewSet,
+        discovered_async_view,
+        discovered_function,
+    )
+
+    manifest_file = tmp_path / "manifest.json"
+    discovered_router = _build_discovered_router(str(manifest_file))
+    assert manifest_file.exists()
+    node = discovered_router.root_node.get_child("discovered")
+    assert list(node.children) == [
+        "items",
+        "view",
+        "function",
+        "function-alias",
+        "attribute",
+        "async",
+    ]
+    assert node.get_child("items").view is DiscoveredViewSet
+
+    manual_router = HybridRouter()
+    manual_router.register("items", ItemViewSet, basename="item")
+    manual_router.register_many(
+        [
+            ("discovered/items", DiscoveredViewSet, "discovered-item"),
+            ("discovered/view", DiscoveredView, "discovered-view"),
+            ("discovered/function", discovered_function, "discovered-function"),
+            (
+                "discovered/function-alias",
+                discovered_function,
+                "discovered-function-alias",
+            ),
+            ("discovered/attribute", AttributeView, "discovered-attribute"),
+            ("discovered/async", discovered_async_view, "discovered-async"),
+        ]
+    )
+    discovered_urlconf = types.ModuleType("discovered_urlconf")
+    discovered_urlconf.urlpatterns = [path("", include(discovered_router.urls))]
+    manual_urlconf = types.ModuleType("manual_urlconf")
+    manual_urlconf.urlpatterns = [path("", include(manual_router.urls))]
+    for path_info in DISCOVERED_PATHS:
+        assert _describe_match(path_info, discovered_urlconf) == _describe_match(
+            path_info, manual_urlconf
+        ), path_info
+
+
+def test_autodiscover_manifest_registers_lazily(tmp_path, db):
+    from django.urls import resolve
+
+    from hybridrouter.discovery import LazyView, LazyViewSet
+
+    manifest_file = tmp_path / "manifest.json"
+    eager_router = _build_discovered_router(str(manifest_file))
+
+    with patch("hybridrouter.hybridrouter.scan_marked_views") as scan:
+        lazy_router = _build_discovered_router(str(manifest_file))
+    scan.assert_not_called()
+    node = lazy_router.root_node.get_child("discovered")
+    assert isinstance(node.get_child("items").view, LazyViewSet)
+    assert isinstance(node.get_child("view").view, LazyView)
+
+    lazy_urlconf = types.ModuleType("lazy_urlconf")
+    lazy_urlconf.urlpatterns = [path("", include(lazy_router.urls))]
+    eager_urlconf = types.ModuleType("eager_urlconf")
+    eager_urlconf.urlpatterns = [path("", include(eager_router.urls))]
+    callbacks = [
+        url.callback
+        for url in lazy_router.urls
+        if isinstance(getattr(url, "callback", None), LazyView)
+    ]
+    assert len(callbacks) > 5
+    # Resolving and reversing do not import the views
+    for path_info in DISCOVERED_PATHS[1:]:
+        assert resolve(path_info, lazy_urlconf).func in callbacks, path_info
+    with override_settings(ROOT_URLCONF=lazy_urlconf):
+        assert reverse("discovered-item-recent") == "/discovered/items/recent/"
+    assert all(callback._view is None for callback in callbacks)
+
+    for path_info in DISCOVERED_PATHS:
+        assert _describe_match(path_info, lazy_urlconf) == _describe_match(
+            path_info, eager_urlconf
+        ), path_info
+    recent = resolve("/discovered/items/recent/", lazy_urlconf).func
+    assert recent.initkwargs["permission_classes"] == [AllowAny]
+    with override_settings(ROOT_URLCONF=lazy_urlconf):
+        response = APIClient().get("/discovered/items/recent/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"recent": True}
+        response = APIClient().get("/discovered/function-alias/")
+        assert response.json() == {"function": True}
+
+
+def test_autodiscover_manifest_keeps_csrf_checks(tmp_path, db):
+    from django.conf import settings
+    from django.urls import resolve
+
+    manifest_file = tmp_path / "manifest.json"
+    eager_router = _build_discovered_router(str(manifest_file))
+    lazy_router = _build_discovered_router(str(manifest_file))
+    eager_urlconf = create_urlconf(eager_router)
+    lazy_urlconf = create_urlconf(lazy_router)
+
+    callback = resolve("/discovered/async/", lazy_urlconf).func
+    assert not hasattr(callback, "csrf_exempt")
+    assert resolve("/discovered/view/", lazy_urlconf).func.csrf_exempt
+    assert resolve("/discovered/items/", lazy_urlconf).func.csrf_exempt
+    assert callback._view is None
+
+    middleware = [
+        *settings.MIDDLEWARE,
+        "django.middleware.csrf.CsrfViewMiddleware",
+    ]
+    for urlconf in (eager_urlconf, lazy_urlconf):
+        with override_settings(ROOT_URLCONF=urlconf, MIDDLEWARE=middleware):
+            client = APIClient(enforce_csrf_checks=True)
+            response = client.post("/discovered/async/")
+            assert response.status_code == status.HTTP_403_FORBIDDEN
+            response = client.post("/discovered/items/recent/")
+            assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+def test_autodiscover_rescans_stale_manifest(tmp_path):
+    from hybridrouter.discovery import scan_marked_views
+
+    manifest_file = tmp_path / "manifest.json"
+    manifest_file.write_text(json.dumps({"version": 1, "key": "stale", "routes": []}))
+    with patch(
+        "hybridrouter.hybridrouter.scan_marked_views", wraps=scan_marked_views
+    ) as scan:
+        _build_discovered_router(str(manifest_file))
+        scan.assert_called_once()
+        _build_discovered_router(str(manifest_file))
+        scan.assert_called_once()
+    assert json.loads(manifest_file.read_text())["key"] != "stale"
+
+
+def test_autodiscover_rescans_when_base_class_changes(tmp_path):
+    from hybridrouter.discovery import get_source_file_signature, scan_marked_views
+
+    manifest_file = tmp_path / "manifest.json"
+    _build_discovered_router(str(manifest_file))
+    dependencies = json.loads(manifest_file.read_text())["dependencies"]
+    # DiscoveredViewSet inherits its actions from tests.viewsets
+    assert {"tests.routes", "tests.viewsets"} <= set(dependencies)
+
+    def edited_signature(module_name):
+        signature = get_source_file_signature(module_name)
+        return signature + ["edited"] if module_name == "tests.viewsets" else signature
+
+    with patch(
+        "hybridrouter.hybridrouter.scan_marked_views", wraps=scan_marked_views
+    ) as scan:
+        _build_discovered_router(str(manifest_file))
+        scan.assert_not_called()
+        with patch(
+            "hybridrouter.discovery.get_source_file_signature", edited_signature
+        ):
+            _build_discovered_router(str(manifest_file))
+        scan.assert_called_once()
+
+
+def test_discovery_settings_are_checked():
+    from django.apps import apps
+    from django.core.exceptions import ImproperlyConfigured
+
+    app_config = apps.get_app_config("hybridrouter")
+    try:
+        with override_settings(HYBRIDROUTER_DISCOVERY_MODULES="views"):
+            with pytest.raises(ImproperlyConfigured):
+                app_config.ready()
+        with override_settings(HYBRIDROUTER_DISCOVERY_MODULES=["api"]):
+            app_config.ready()
+            assert app_config.discovery_modules == ("api",)
+    finally:
+        app_config.ready()
+
+
+def test_register_by_import_path():
+    from hybridrouter import HybridRouter
+
+    routers = []
+    for lazy in (False, True):
+        router = HybridRouter()
+        router.register(
+            "items", "tests.viewsets.ItemViewSet" if lazy else ItemViewSet, "item"
+        )
+        router.register(
+            "items-view", "tests.views.ItemView" if lazy else ItemView, "item-view"
+        )
+        router.register(
+            "level1/view", "tests.views.item_view" if lazy else item_view, "view"
+        )
+        routers.append(router)
+    assert routers[1].root_node.get_child("items").view == "tests.viewsets.ItemViewSet"
+
+    urlconfs = []
+    for router in routers:
+        urlconf = types.ModuleType("urlconf")
+        urlconf.urlpatterns = [path("", include(router.urls))]
+        urlconfs.append(urlconf)
+    for path_info in ["/", "/items/", "/items/1/", "/items-view/", "/level1/view/"]:
+        assert _describe_match(path_info, urlconfs[1]) == _describe_match(
+            path_info, urlconfs[0]
+        ), path_info
+
+
+LAZY_SUBTREE_PATHS = [
+    "/",
+    "/items/",
+    "/admin",
+    "/admin/",
+    "/admin/reports/",
+    "/admin/reports/1/",
+    "/admin/summary/",
+    "/administration/",
+]
+
+
+def _build_lazy_router(lazy_subtrees=(), **attrs):
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    router.lazy_subtrees = lazy_subtrees
+    for attr, value in attrs.items():
+        setattr(router, attr, value)
+    router.register("items", ItemViewSet, basename="item")
+    router.register("admin/reports", "tests.lazy_views.ReportViewSet", "report")
+    router.register("admin/summary", "tests.lazy_views.ReportView", "summary")
+    return router
+
+
+@pytest.mark.parametrize("use_tree_resolver", [False, True])
+def test_lazy_subtrees_are_built_on_first_request(use_tree_resolver):
+    import sys
+
+    from django.urls import resolve
+
+    from hybridrouter.resolvers import LazySubtreeResolver
+
+    sys.modules.pop("tests.lazy_views", None)
+    lazy_router = _build_lazy_router(["admin"], use_tree_resolver=use_tree_resolver)
+    lazy_urlconf = types.ModuleType("lazy_urlconf")
+    lazy_urlconf.urlpatterns = [path("", include(lazy_router.urls))]
+    (resolver,) = lazy_router.root_node.get_child("admin").patterns
+    assert isinstance(resolver, LazySubtreeResolver)
+
+    assert resolve("/items/1/", lazy_urlconf).url_name == "item-detail"
+    assert not resolver.is_built
+    assert "tests.lazy_views" not in sys.modules
+
+    assert resolve("/admin/reports/7/", lazy_urlconf).kwargs == {"pk": "7"}
+    assert resolver.is_built
+    assert "tests.lazy_views" in sys.modules
+
+    eager_urlconf = types.ModuleType("eager_urlconf")
+    eager_urlconf.urlpatterns = [path("", include(_build_lazy_router().urls))]
+    for path_info in LAZY_SUBTREE_PATHS:
+        assert _describe_match(path_info, lazy_urlconf) == _describe_match(
+            path_info, eager_urlconf
+        ), path_info
+    with override_settings(ROOT_URLCONF=lazy_urlconf):
+        assert reverse("summary") == "/admin/summary/"
+        response = APIClient().get("/admin/reports/7/")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"pk": "7"}
+
+
+@pytest.mark.parametrize("trailing_slash", ["/", ""])
+def test_api_root_does_not_build_lazy_subtrees(trailing_slash):
+    import sys
+
+    sys.modules.pop("tests.lazy_views", None)
+    lazy_router = _build_lazy_router(["admin"], trailing_slash=trailing_slash)
+    lazy_urlconf = create_urlconf(lazy_router)
+    (resolver,) = lazy_router.root_node.get_child("admin").patterns
+    expected = {
+        "items": f"http://testserver/items{trailing_slash}",
+        "admin": "http://testserver/admin/",
+    }
+
+    with override_settings(ROOT_URLCONF=lazy_urlconf):
+        client = APIClient()
+        for _ in range(2):
+            response = client.get("/")
+            assert response.json() == expected
+            assert not resolver.is_built
+            assert "tests.lazy_views" not in sys.modules
+
+        # Other reverse() calls still see every route
+        detail_url = reverse("report-detail", args=[7])
+        assert detail_url == f"/admin/reports/7{trailing_slash}"
+        assert resolver.is_built
+        assert client.get("/").json() == expected
+        assert client.get("/admin/").json() == {
+            "reports": f"http://testserver/admin/reports{trailing_slash}",
+            "summary": "http://testserver/admin/summary/",
+        }
+
+
+def test_register_import_path_requires_basename(hybrid_router):
+    import sys
+
+    from django.core.exceptions import ImproperlyConfigured
+
+    from hybridrouter.discovery import LazyView
+
+    sys.modules.pop("tests.lazy_views", None)
+    with pytest.raises(ImproperlyConfigured, match="register it with a `basename`"):
+        hybrid_router.register("reports", "tests.lazy_views.ReportViewSet")
+    with pytest.raises(ImproperlyConfigured, match="reports: Cannot determine"):
+        hybrid_router.register_many([("reports", "tests.lazy_views.ReportView")])
+    with pytest.raises(ImproperlyConfigured, match="Cannot determine"):
+        hybrid_router.register("summary", LazyView("tests.lazy_views.ReportView"))
+    assert "tests.lazy_views" not in sys.modules
+    assert not hybrid_router.basename_registry
+
+
+def test_lazy_subtree_is_built_once_under_concurrency():
+    import threading
+    import time
+
+    from django.urls import resolve
+
+    router = _build_lazy_router(["admin"])
+    builds = []
+    build_lazy_subtree = router._build_lazy_subtree
+
+    def slow_build(node, prefix):
+        builds.append(prefix)
+        time.sleep(0.05)
+        return build_lazy_subtree(node, prefix)
+
+    router._build_lazy_subtree = slow_build
+    urlconf = types.ModuleType("urlconf")
+    urlconf.urlpatterns = [path("", include(router.urls))]
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        match = resolve("/admin/reports/1/", urlconf)
+        results.append((match.url_name, match.kwargs))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert builds == ["admin/"]
+    assert results == [("report-detail", {"pk": "1"})] * 8
+
+
+def test_concurrent_access_builds_once():
+    import threading
+    import time
+
+    from hybridrouter import HybridRouter
+
+    router = _build_mixed_router()
+    get_urls = HybridRouter.get_urls
+
+    def slow_get_urls(self):
+        time.sleep(0.05)
+        return get_urls(self)
+
+    barrier = threading.Barrier(16)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(router.urls)
+
+    with patch.object(
+        HybridRouter, "get_urls", autospec=True, side_effect=slow_get_urls
+    ) as mocked:
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert mocked.call_count == 1
+    assert len(results) == 16
+    assert all(urls is results[0] for urls in results)
+
+
+def test_bulk_register_only_defers_its_own_thread(hybrid_router):
+    import threading
+
+    def register_other():
+        hybrid_router.register("other", ItemView, basename="other")
+
+    with pytest.raises(RuntimeError):
+        with hybrid_router.bulk_register():
+            hybrid_router.register("discarded", ItemView, basename="discarded")
+            thread = threading.Thread(target=register_other)
+            thread.start()
+            thread.join()
+            # Registered by the other thread right away
+            assert hybrid_router.root_node.get_child("other") is not None
+            raise RuntimeError
+    assert list(hybrid_router.root_node.children) == ["other"]
+    assert list(hybrid_router.basename_registry) == ["other"]
+
+
+def test_concurrent_registrations_and_builds_do_not_interleave():
+    import sys
+    import threading
+
+    from django.urls import resolve
+
+    from hybridrouter import HybridRouter
+
+    router = HybridRouter()
+    thread_count, per_thread = 16, 25
+    barrier = threading.Barrier(thread_count)
+    errors = []
+
+    def worker(idx):
+        barrier.wait()
+        try:
+            for i in range(per_thread):
+                router.register(f"t{idx}/v{i}", ItemView, basename="item")
+                if i % 5 == 0:
+                    router.urls  # Builds while other threads register
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=worker, args=(idx,)) for idx in range(thread_count)
+    ]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads as often as possible
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert not errors
+
+    total = thread_count * per_thread
+    registrations = router.basename_registry["item"]
+    assert len(registrations) == total
+    expected = {f"item_{idx}" for idx in range(1, total + 1)}
+    assert {reg.basename for reg in registrations} == expected
+    urlconf = types.ModuleType("urlconf")
+    urlconf.urlpatterns = [path("", include(router.urls))]
+    names = set()
+    for reg in registrations:
+        match = resolve(f"/{reg.prefix}/", urlconf)
+        assert match.url_name == reg.basename
+        names.add(match.url_name)
+    assert names == expected
+
+
+def _async_get(urlconf, url, **headers):
+    from asgiref.sync import async_to_sync
+    from django.test import AsyncClient
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        # Headers are given by their HTTP names to AsyncClient
+        return async_to_sync(AsyncClient().get)(url, **headers)
+
+
+def test_async_api_root_views(db):
+    from asgiref.sync import iscoroutinefunction
+    from django.urls import resolve
+    from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+    from hybridrouter.views import AsyncAPIRootView
+
+    sync_router = _build_mixed_router()
+    async_router = _build_mixed_router(async_views=True)
+    sync_urlconf = create_urlconf(sync_router)
+    async_urlconf = create_urlconf(async_router)
+
+    for url in ("/", "/level1/", "/level1/level2/"):
+        assert not iscoroutinefunction(resolve(url, sync_urlconf).func)
+        assert iscoroutinefunction(resolve(url, async_urlconf).func)
+        with override_settings(ROOT_URLCONF=sync_urlconf):
+            expected = APIClient().get(url)
+        response = _async_get(async_urlconf, url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "application/json"
+        assert response.json() == expected.json()
+        assert response["ETag"] == expected["ETag"]
+
+        etag = expected["ETag"]
+        response = _async_get(async_urlconf, url, **{"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # The browsable API, which may load the user, is rendered in a thread
+    renderers = [JSONRenderer, BrowsableAPIRenderer]
+    with patch.object(AsyncAPIRootView, "renderer_classes", renderers):
+        response = _async_get(async_urlconf, "/", Accept="text/html")
+    assert response.status_code == status.HTTP_200_OK
+    assert b"items-view" in response.content
+
+
+def test_async_api_root_falls_back_when_permissions_need_the_user(caplog):
+    from asgiref.sync import iscoroutinefunction
+    from django.urls import resolve
+    from rest_framework.permissions import IsAuthenticated
+
+    from hybridrouter.views import AsyncAPIRootView
+
+    router = _build_mixed_router(async_views=True)
+    with patch.object(AsyncAPIRootView, "permission_classes", [IsAuthenticated]):
+        with caplog.at_level("WARNING", logger="hybridrouter"):
+            urlconf = create_urlconf(router)
+    assert "async_views" in caplog.text
+    assert not iscoroutinefunction(resolve("/", urlconf).func)
+
+
+def test_autodiscover_manifest_keeps_async_views(tmp_path):
+    from asgiref.sync import iscoroutinefunction
+    from django.urls import resolve
+
+    from hybridrouter.discovery import LazyView
+
+    manifest_file = tmp_path / "manifest.json"
+    _build_discovered_router(str(manifest_file))
+    lazy_router = _build_discovered_router(str(manifest_file))
+    urlconf = create_urlconf(lazy_router)
+
+    callback = resolve("/discovered/async/", urlconf).func
+    assert isinstance(callback, LazyView)
+    assert iscoroutinefunction(callback)
+    assert not iscoroutinefunction(resolve("/discovered/view/", urlconf).func)
+    assert callback._view is None
+
+    response = _async_get(urlconf, "/discovered/async/")
+    assert response.json() == {"async": True}
+
+
+SHORT_CIRCUIT_REQUESTS = [
+    ("delete", "/items/"),
+    ("post", "/items/1/"),
+    ("post", "/slug-items/some-name/"),
+    ("post", "/items-view/"),
+    ("delete", "/level1/level2/view/"),
+    ("post", "/level1/"),
+    ("put", "/"),
+    ("head", "/actions/1/mark-read/"),
+    ("get", "/actions/1/mark-read/"),
+    ("delete", "/actions/recent/"),
+]
+
+
+def _build_short_circuit_router(**attrs):
+    router = _build_mixed_router(**attrs)
+    router.register("actions", ActionItemViewSet, basename="action")
+    return router
+
+
+@pytest.mark.parametrize("method,url", SHORT_CIRCUIT_REQUESTS)
+def test_short_circuit_method_not_allowed(method, url, db):
+    default_urlconf = create_urlconf(_build_short_circuit_router())
+    fast_router = _build_short_circuit_router(short_circuit_methods=True)
+    fast_urlconf = create_urlconf(fast_router)
+
+    with override_settings(ROOT_URLCONF=default_urlconf):
+        expected = getattr(APIClient(), method)(url)
+    assert expected.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+    with override_settings(ROOT_URLCONF=fast_urlconf):
+        with patch("rest_framework.views.APIView.initial") as initial:
+            response = getattr(APIClient(), method)(url)
+    initial.assert_not_called()
+    assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+    assert response["Allow"] == expected["Allow"]
+    assert response["Content-Type"] == expected["Content-Type"]
+    assert response.content == expected.content
+
+
+def test_short_circuit_allowed_methods_and_preflight(db):
+    from asgiref.sync import iscoroutinefunction
+    from django.urls import resolve
+
+    from hybridrouter.discovery import LazyView
+    from hybridrouter.methods import get_allowed_methods
+
+    default_router = _build_short_circuit_router()
+    fast_router = _build_short_circuit_router(
+        short_circuit_methods=True, instrument_routes=True, async_views=True
+    )
+    default_urlconf = create_urlconf(default_router)
+    fast_urlconf = create_urlconf(fast_router)
+
+    allowed_methods = default_router.get_allowed_methods()
+    assert fast_router.get_allowed_methods() == allowed_methods
+    assert allowed_methods["item-list"] == ("GET", "POST", "HEAD", "OPTIONS")
+    assert allowed_methods["action-mark-read"] == ("POST", "OPTIONS")
+    assert allowed_methods["level1/"] == ("GET", "HEAD", "OPTIONS")
+    assert "nested/" not in allowed_methods
+    assert iscoroutinefunction(resolve("/", fast_urlconf).func)
+
+    client = APIClient()
+    for url in ("/items/", "/items/1/", "/actions/1/mark-read/", "/level1/"):
+        with override_settings(ROOT_URLCONF=default_urlconf):
+            expected = client.options(url)
+        assert expected.status_code == status.HTTP_200_OK
+        assert tuple(expected["Allow"].split(", ")) in allowed_methods.values()
+
+        with override_settings(ROOT_URLCONF=fast_urlconf):
+            # Plain OPTIONS requests still get the view's metadata
+            response = client.options(url)
+            assert response.json() == expected.json()
+            with patch("rest_framework.views.APIView.initial") as initial:
+                response = client.options(
+                    url,
+                    HTTP_ORIGIN="https://example.com",
+                    HTTP_ACCESS_CONTROL_REQUEST_METHOD="POST",
+                )
+            initial.assert_not_called()
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Allow"] == expected["Allow"]
+        assert response.content == b""
+
+    with override_settings(ROOT_URLCONF=fast_urlconf):
+        assert client.get("/items/").status_code == status.HTTP_200_OK
+        client.delete("/items/")
+    hits = {
+        (item["route"], item["method"]): item["hits"]
+        for item in fast_router.route_metrics.as_dict()["routes"]
+    }
+    assert hits[("item-list", "DELETE")] == 1
+
+    # Lazy stand-ins are not imported to find their methods
+    lazy_view = LazyView("tests.lazy_views.ReportView")
+    assert get_allowed_methods(lazy_view) is None
+    assert lazy_view._view is None
+
+
+DISPATCH_PATHS = TREE_RESOLVER_PATHS + [
+    "/items//",
+    "/items/1.json/",
+    "/items/1/extra/",
+    "/items-other/",
+    "/actions",
+    "/actions/",
+    "/actions/12/",
+    "/actions/12//",
+    "/actions/abc/",
+    "/actions/recent/",
+    "/actions/recent",
+    "/actions/12/mark-read/",
+    "/actions/12/mark-read",
+    "/actions/12/mark-read/extra/",
+    "/actions/by-name/foo/",
+    "/actions/by-name/",
+    "/api/actions/12/mark-read/",
+]
+
+
+@pytest.mark.parametrize("trailing_slash", ["/", "", "/?"])
+@pytest.mark.parametrize("use_tree_resolver", [False, True])
+def test_dispatched_viewset_routes_match_separate_patterns(
+    trailing_slash, use_tree_resolver
+):
+    from django.urls import resolve
+
+    from hybridrouter.resolvers import ViewSetDispatchResolver
+
+    urlconfs = []
+    routers = []
+    for dispatch_viewset_routes in (False, True):
+        router = _build_mixed_router(use_tree_resolver=use_tree_resolver)
+        router.trailing_slash = trailing_slash
+        router.dispatch_viewset_routes = dispatch_viewset_routes
+        router.register("actions", ActionItemViewSet, basename="action")
+        urlconf = types.ModuleType(f"urlconf_dispatch_{dispatch_viewset_routes}")
+        urlconf.urlpatterns = [
+            path("", include(router.urls)),
+            path("api/", include((router.urls, "api"), namespace="api")),
+        ]
+        urlconfs.append(urlconf)
+        routers.append(router)
+
+    separate_urlconf, dispatch_urlconf = urlconfs
+    dispatchers = [
+        url for url in routers[1].get_urls() if isinstance(url, ViewSetDispatchResolver)
+    ]
+    assert [dispatcher.prefix for dispatcher in dispatchers] == [
+        "items",
+        "slug-items",
+        "actions",
+    ]
+    # Nothing is created before it is needed
+    assert all(view is None for d in dispatchers for view in d._views)
+    assert all("url_patterns" not in vars(d) for d in dispatchers)
+
+    for path_info in DISPATCH_PATHS:
+        expected = _describe_match(path_info, separate_urlconf)
+        assert _describe_match(path_info, dispatch_urlconf) == expected, path_info
+        if expected is not None:
+            expected_match = resolve(path_info, separate_urlconf)
+            match = resolve(path_info, dispatch_urlconf)
+            assert match.route == expected_match.route, path_info
+            assert match.args == expected_match.args, path_info
+    created = sum(view is not None for d in dispatchers for view in d._views)
+    assert 0 < created < sum(len(d.routes) for d in dispatchers)
+    assert all("url_patterns" not in vars(d) for d in dispatchers)
+
+    names = [
+        ("item-list", {}),
+        ("item-detail", {"pk": 1}),
+        ("slug-item-detail", {"name": "some-name"}),
+        ("action-recent", {}),
+        ("api:action-mark-read", {"pk": 12}),
+        ("api:action-by-name", {"name": "foo"}),
+    ]
+    for name, kwargs in names:
+        with override_settings(ROOT_URLCONF=separate_urlconf):
+            expected = reverse(name, kwargs=kwargs)
+        with override_settings(ROOT_URLCONF=dispatch_urlconf):
+            assert reverse(name, kwargs=kwargs) == expected
+
+    with override_settings(ROOT_URLCONF=dispatch_urlconf):
+        response = APIClient().get(reverse("action-recent"))
+        assert response.json() == {"recent": True}
+
+
+def test_dispatched_viewset_routes_reverse_without_views(db):
+    from hybridrouter import HybridRouter
+    from hybridrouter.resolvers import ViewSetDispatchResolver
+
+    router = HybridRouter()
+    router.dispatch_viewset_routes = True
+    for idx in range(5):
+        router.register(f"a{idx}", ActionItemViewSet, basename=f"a{idx}")
+    urlconf = create_urlconf(router)
+    dispatchers = [
+        url for url in router.urls if isinstance(url, ViewSetDispatchResolver)
+    ]
+    assert len(dispatchers) == 5
+
+    with override_settings(ROOT_URLCONF=urlconf):
+        assert reverse("a3-list") == "/a3/"
+        response = APIClient().get("/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["a4"] == "http://testserver/a4/"
+        assert all("url_patterns" in vars(d) for d in dispatchers)
+        assert all(view is None for d in dispatchers for view in d._views)
+
+        response = APIClient().get(reverse("a3-recent"))
+        assert response.json() == {"recent": True}
+    created = [view is not None for d in dispatchers for view in d._views]
+    assert sum(created) == 1
+
+
+def test_dispatched_viewset_routes_fall_back_to_patterns(db):
+    from hybridrouter import HybridRouter
+    from hybridrouter.resolvers import ViewSetDispatchResolver
+
+    class RegexLookupViewSet(ItemViewSet):
+        lookup_value_regex = "[0-9/]+"
+
+    router = HybridRouter()
+    router.dispatch_viewset_routes = True
+    router.short_circuit_methods = True
+    router.instrument_routes = True
+    router.register("items", ItemViewSet, basename="item")
+    router.register("regex", RegexLookupViewSet, basename="regex")
+    router.register("<int:year>/items", ItemViewSet, basename="year-item")
+    urls = router.get_urls()
+    assert isinstance(urls[0], ViewSetDispatchResolver)
+    assert not any(isinstance(url, ViewSetDispatchResolver) for url in urls[1:])
+
+    urlconf = create_urlconf(router)
+    with override_settings(ROOT_URLCONF=urlconf):
+        client = APIClient()
+        assert client.get("/items/").status_code == status.HTTP_200_OK
+        assert client.delete("/items/").status_code == (
+            status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+    hits = {
+        (item["route"], item["method"]): item["hits"]
+        for item in router.route_metrics.as_dict()["routes"]
+    }
+    assert hits == {("item-list", "GET"): 1, ("item-list", "DELETE"): 1}
+    assert router.get_allowed_methods()["item-detail"] == (
+        "GET",
+        "PUT",
+        "PATCH",
+        "DELETE",
+        "HEAD",
+        "OPTIONS",
+    )
+
+
+@pytest.mark.parametrize("use_tree_resolver", [False, True])
+def test_resolve_cache(use_tree_resolver):
+    from django.urls import Resolver404, resolve
+
+    from hybridrouter.resolvers import ResolveCache
+
+    uncached_router = _build_mixed_router(use_tree_resolver=use_tree_resolver)
+    cached_router = _build_mixed_router(
+        use_tree_resolver=use_tree_resolver, resolve_cache_size=4
+    )
+    assert cached_router.resolve_cache is None
+    urlconfs = []
+    for router in (uncached_router, cached_router):
+        urlconf = types.ModuleType("urlconf_resolve_cache")
+        urlconf.urlpatterns = [
+            path("", include(router.urls)),
+            path("api/", include((router.urls, "api"), namespace="api")),
+        ]
+        urlconfs.append(urlconf)
+    uncached_urlconf, cached_urlconf = urlconfs
+    cache = cached_router.resolve_cache
+    assert isinstance(cache, ResolveCache)
+
+    paths = TREE_RESOLVER_PATHS + ["/api/items/", "/api/level1/", "/unknown/"]
+    for _ in range(2):
+        for path_info in paths:
+            expected = _describe_match(path_info, uncached_urlconf)
+            assert _describe_match(path_info, cached_urlconf) == expected, path_info
+            if expected is not None:
+                match = resolve(path_info, cached_urlconf)
+                assert match.route == resolve(path_info, uncached_urlconf).route
+    stats = cache.as_dict()
+    assert stats["size"] == 4
+    assert stats["hits"] > 0
+
+    # Detail routes and unknown paths do not evict the cached paths
+    cache.clear()
+    resolve("/items/", cached_urlconf)
+    for pk in range(20):
+        resolve(f"/items/{pk}/", cached_urlconf)
+    with pytest.raises(Resolver404):
+        resolve("/unknown/", cached_urlconf)
+    # Tried under "" (a miss) before "api/" (a hit)
+    resolve("/api/items/", cached_urlconf)
+    assert cache.as_dict() == {"size": 1, "maxsize": 4, "hits": 1, "misses": 23}
+    with patch("hybridrouter.resolvers._resolve_in_order") as resolve_in_order:
+        match = resolve("/items/", cached_urlconf)
+    resolve_in_order.assert_not_called()
+    assert match.url_name == "item-list" and match.namespace == ""
+    assert len(match.tried) == 1  # Only the matched patterns
+
+    # Least recently used paths go first
+    for path_info in ("/items-view/", "/level1/", "/level1/other/", "/"):
+        resolve(path_info, cached_urlconf)
+    assert "items/" not in cache._matches
+    assert list(cache._matches) == ["items-view/", "level1/", "level1/other/", ""]
+
+
+def test_resolve_cache_renewed_by_builds(db):
+    router = _build_mixed_router(resolve_cache_size=8, instrument_routes=True)
+    urlconf = create_urlconf(router)
+    with override_settings(ROOT_URLCONF=urlconf):
+        client = APIClient()
+        for _ in range(3):
+            assert client.get("/items/").status_code == status.HTTP_200_OK
+    cache = router.resolve_cache
+    assert cache.hits == 2
+    ((route, hits),) = [
+        (item["route"], item["hits"])
+        for item in router.route_metrics.as_dict()["routes"]
+    ]
+    assert (route, hits) == ("item-list", 3)
+
+    router.register("other", ItemView, basename="other")
+    router.urls
+    assert router.resolve_cache is not cache
+    assert router.resolve_cache.as_dict()["hits"] == 0
+
+
+DERIVE_PATHS = TREE_RESOLVER_PATHS + ["/new/", "/new/1/"]
+
+
+def test_derive_shares_unchanged_subtrees():
+    from hybridrouter import HybridRouter
+
+    base = _build_mixed_router()
+    base_urlconf = create_urlconf(base)
+    before = {p: _describe_match(p, base_urlconf) for p in DERIVE_PATHS}
+    shared = base.root_node.get_child("slug-items")
+
+    derived = base.derive(
+        overrides={"items": (SlugItemViewSet, "item"), "new": ItemViewSet},
+        remove=["level1/other"],
+    )
+    with patch.object(
+        derived, "_get_viewset_urls", wraps=derived._get_viewset_urls
+    ) as get_viewset_urls:
+        derived_urlconf = create_urlconf(derived)
+    # Only the ViewSets of the overridden prefixes are built again
+    assert get_viewset_urls.call_count == 2
+    assert derived.root_node.get_child("slug-items") is shared
+    assert derived.root_node.get_child("nested") is base.root_node.get_child("nested")
+    assert derived.root_node.get_child("items") is not base.root_node.get_child("items")
+    assert derived.root_node is not base.root_node
+
+    expected = HybridRouter()
+    expected.register("items", SlugItemViewSet, basename="item")
+    expected.register("slug-items", SlugItemViewSet, basename="slug-item")
+    expected.register("items-view", ItemView, basename="item-view")
+    expected.register("level1/level2/view", item_view, basename="deep-view")
+    nested_router = DefaultRouter()
+    nested_router.register("subitems", ItemViewSet, basename="subitem")
+    expected.register_nested_router("nested/", nested_router)
+    expected.register("new", ItemViewSet, basename="item")
+    expected_urlconf = create_urlconf(expected)
+    for path_info in DERIVE_PATHS:
+        assert _describe_match(path_info, derived_urlconf) == _describe_match(
+            path_info, expected_urlconf
+        ), path_info
+    with override_settings(ROOT_URLCONF=derived_urlconf):
+        assert reverse("item_2-list") == "/new/"
+
+    # The base router is left as it was, and shares its views with the derived one
+    base_urlconf = create_urlconf(base)
+    assert {p: _describe_match(p, base_urlconf) for p in DERIVE_PATHS} == before
+    assert [reg.basename for reg in base.basename_registry["item"]] == ["item"]
+    derived_node = derived.root_node.get_child("slug-items")
+    assert derived_node.patterns is shared.patterns
+    assert shared.patterns[0].callback is derived_node.patterns[0].callback
+
+    # Later registrations and renames stay in their own version
+    base.register("later", ItemView, basename="later")
+    derived.register("more", SlugItemViewSet, basename="slug-item")
+    base_urlconf = create_urlconf(base)
+    derived_urlconf = create_urlconf(derived)
+    assert _describe_match("/later/", derived_urlconf) is None
+    assert _describe_match("/more/", base_urlconf) is None
+    assert _describe_match("/slug-items/x/", base_urlconf)[3] == "slug-item-detail"
+    assert _describe_match("/slug-items/x/", derived_urlconf)[3] == (
+        "slug-item_1-detail"
+    )
+    assert base.root_node.get_child("slug-items").basename == "slug-item"
+
+
+def test_derived_router_with_other_settings():
+    base = _build_mixed_router(use_tree_resolver=True)
+    base.urls
+    derived = base.derive()
+    assert derived.use_tree_resolver is True
+    assert derived.route_metrics is not base.route_metrics
+
+    derived.trailing_slash = ""
+    derived_urlconf = create_urlconf(derived)
+    assert _describe_match("/items/", derived_urlconf) is None
+    assert _describe_match("/items", derived_urlconf)[3] == "item-list"
+    assert derived.root_node.get_child("items") is not base.root_node.get_child("items")
+
+    # The patterns cached in the base router were built with its own settings
+    base.register("other", ItemView, basename="other")
+    base_urlconf = create_urlconf(base)
+    assert _describe_match("/items/", base_urlconf)[3] == "item-list"
+    assert _describe_match("/other/", base_urlconf)[3] == "other"
+
+
+def test_derive_removes_registered_prefixes():
+    from django.core.exceptions import ImproperlyConfigured
+
+    base = _build_mixed_router()
+    derived = base.derive(remove=["level1"])
+    urlconf = create_urlconf(derived)
+    for path_info in ("/level1/", "/level1/other/", "/level1/level2/view/"):
+        assert _describe_match(path_info, urlconf) is None
+    assert "deep-view" not in derived.basename_registry
+    assert "deep-view" in base.basename_registry
+    assert _describe_match("/level1/other/", create_urlconf(base)) is not None
+
+    for remove in (["unknown"], ["level1/unknown"], [""]):
+        with pytest.raises(ImproperlyConfigured, match="Cannot remove"):
+            base.derive(remove=remove)
+
+
+def test_derive_renumbers_conflicting_basenames():
+    from hybridrouter import HybridRouter
+
+    def get_url_names(router):
+        return {
+            reg.prefix: reg.basename
+            for registrations in router.basename_registry.values()
+            for reg in registrations
+        }
+
+    def build(*prefixes):
+        router = HybridRouter()
+        for prefix in prefixes:
+            router.register(prefix, ItemView, basename="x")
+        return router
+
+    base = build("a", "b", "c")
+    overridden = base.derive(overrides=[("b", ItemView, "x")])
+    moved = base.derive(remove=["b"], overrides=[("d", ItemView, "x")])
+    removed = base.derive(remove=["b", "c"])
+    cases = [
+        (overridden, build("a", "c", "b")),
+        (moved, build("a", "c", "d")),
+        (removed, build("a")),
+    ]
+    for derived, expected in cases:
+        names = get_url_names(derived)
+        assert names == get_url_names(expected)
+        assert len(set(names.values())) == len(names)
+        urlconf = create_urlconf(derived)
+        with override_settings(ROOT_URLCONF=urlconf):
+            for prefix, name in names.items():
+                assert reverse(name) == f"/{prefix}/"
+                assert _describe_match(f"/{prefix}/", urlconf)[3] == name
+    assert get_url_names(removed) == {"a": "x"}
+    assert get_url_names(base) == {"a": "x_1", "b": "x_2", "c": "x_3"}
+
+    # Later registrations are numbered after the routes left
+    removed.register("e", ItemView, basename="x")
+    assert get_url_names(removed) == {"a": "x_1", "e": "x_2"}
+
+
+def test_derive_prunes_emptied_nodes():
+    base = _build_mixed_router()
+    derived = base.derive(remove=["level1/level2/view"])
+    assert derived.root_node.get_child("level1").get_child("level2") is None
+    with override_settings(ROOT_URLCONF=create_urlconf(derived)):
+        client = APIClient()
+        assert "level1" in client.get("/").json()
+        assert client.get("/level1/").json() == {
+            "other": "http://testserver/level1/other/"
+        }
+        assert client.get("/level1/level2/").status_code == 404
+
+    derived = base.derive(remove=["level1/level2/view", "level1/other"])
+    assert derived.root_node.get_child("level1") is None
+    with override_settings(ROOT_URLCONF=create_urlconf(derived)):
+        assert "level1" not in APIClient().get("/").json()
+    assert "level1" in base.root_node.children
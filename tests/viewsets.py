@@ -1,4 +1,8 @@
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ViewSet
+
 from .models import Item
 from .serializers import ItemSerializer
 
@@ -16,3 +20,21 @@ class SlugItemViewSet(ModelViewSet):
 
 class EmptyViewSet(ViewSet):
     pass
+
+
+class ActionItemViewSet(ModelViewSet):
+    queryset = Item.objects.all()
+    serializer_class = ItemSerializer
+    lookup_value_regex = "[0-9]+"
+
+    @action(detail=False, permission_classes=[AllowAny])
+    def recent(self, request):
+        return Response({"recent": True})
+
+    @action(detail=True, methods=["post"], url_path="mark-read")
+    def mark_read(self, request, pk=None):
+        return Response({"read": pk})
+
+    @action(detail=False, url_path=r"by-name/(?P<name>[^/.]+)")
+    def by_name(self, request, name=None):
+        return Response({"name": name})